@@ -0,0 +1,179 @@
+import asyncio
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from utils import settings
+
+
+class ConcurrencyLimit:
+    """Concurrency limit for a class of routes with a bounded wait queue."""
+
+    def __init__(self, limit: int, queue_size: int, wait_timeout: float):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.queue_size = queue_size
+        self.wait_timeout = wait_timeout
+        self.waiting = 0
+
+    async def acquire(self) -> bool:
+        """Wait for a slot. Returns False right away if the queue is full, or after the wait timeout."""
+        if self.semaphore.locked() and self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self.semaphore.release()
+
+
+class TokenBuckets:
+    """Token bucket rate limits per key (client ip, phone number...)."""
+
+    def __init__(self, per_minute: int, burst: int, max_keys: int = 100_000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Take a token for key. Returns 0 if allowed, otherwise the seconds until a token is available."""
+        now = time.monotonic()
+        tokens, last = self.buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        # keep the most recently used keys only
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+# expensive routes, by class. everything else is not limited
+ROUTE_CLASSES = [
+    ("login", "POST", re.compile(r"^/farmers/login/?$")),
+    ("bulk", "POST", re.compile(r"^/seasons/[^/]+/(planned|actual)-activities(/stream)?/?$")),
+]
+
+# login bodies are tiny, anything bigger is not worth parsing for the phone number
+MAX_LOGIN_BODY = 4096
+
+
+class AdmissionControlMiddleware:
+    """Admission control for expensive routes.
+
+    Login (bcrypt) and activity batch routes each get their own concurrency limit and a
+    bounded wait queue, so a burst on them cannot take the whole threadpool from cheap
+    reads. Requests that find the queue full, or wait too long, are shed with
+    503 Retry-After. Login is also rate limited per client ip and per phone number with
+    token buckets (429 Retry-After). The client ip is the peer address, or the address in
+    X-Forwarded-For when the peer is one of ADMISSION_TRUSTED_PROXIES.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.trusted_proxies = {ip.strip() for ip in settings.ADMISSION_TRUSTED_PROXIES.split(",") if ip.strip()}
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        self.limits = {
+            "login": ConcurrencyLimit(settings.ADMISSION_LOGIN_CONCURRENCY, settings.ADMISSION_LOGIN_QUEUE, timeout),
+            "bulk": ConcurrencyLimit(settings.ADMISSION_BULK_CONCURRENCY, settings.ADMISSION_BULK_QUEUE, timeout),
+        }
+        self.login_ip_buckets = TokenBuckets(settings.LOGIN_RATE_PER_MINUTE, settings.LOGIN_RATE_BURST)
+        self.login_phone_buckets = TokenBuckets(settings.LOGIN_RATE_PER_MINUTE, settings.LOGIN_RATE_BURST)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route_class = None
+        for name, method, pattern in ROUTE_CLASSES:
+            if scope["method"] == method and pattern.match(scope["path"]):
+                route_class = name
+                break
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        if route_class == "login":
+            receive, wait = await self._rate_limit_login(scope, receive)
+            if wait:
+                response = JSONResponse(
+                    {"detail": "Too many login attempts, retry later"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                return await response(scope, receive, send)
+
+        limit = self.limits[route_class]
+        if not await limit.acquire():
+            response = JSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(limit.wait_timeout))},
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    def _client_ip(self, scope: Scope) -> str:
+        """The peer address, or for a trusted proxy the last address in X-Forwarded-For that
+        is not one of the trusted proxies. Addresses left of it are set by the client."""
+        peer = scope["client"][0] if scope.get("client") else "unknown"
+        if peer not in self.trusted_proxies:
+            return peer
+        forwarded = [
+            address.strip()
+            for name, value in scope["headers"] if name == b"x-forwarded-for"
+            for address in value.decode("latin-1").split(",") if address.strip()
+        ]
+        for address in reversed(forwarded):
+            if address not in self.trusted_proxies:
+                return address
+        return forwarded[0] if forwarded else peer
+
+    async def _rate_limit_login(self, scope: Scope, receive: Receive) -> tuple[Receive, float]:
+        """Apply the login token buckets. Returns a receive replaying the body that was read
+        for the phone number, and the seconds to wait (0 if allowed)."""
+        wait = self.login_ip_buckets.take(self._client_ip(scope))
+
+        # read the body to find the phone number, then hand the same messages to the app
+        messages = []
+        size = 0
+        more_body = True
+        while more_body and size <= MAX_LOGIN_BODY:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            more_body = message.get("more_body", False)
+
+        if not more_body and size <= MAX_LOGIN_BODY:
+            try:
+                body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+                phone_number = json.loads(body).get("phoneNumber")
+            except (ValueError, AttributeError):
+                phone_number = None
+            if isinstance(phone_number, str):
+                wait = max(wait, self.login_phone_buckets.take(phone_number))
+
+        async def replay() -> dict:
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return replay, wait
@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 import os
+import logging
 from dotenv import load_dotenv
 
 # Load the .env file
@@ -13,7 +14,9 @@ load_dotenv()
 
 # Access env vars
 # Use .env if present, otherwise default to local SQLite
-DATABASE_URL = "sqlite:///./sqlitedb.db"
+# With sharding (SHARD_DATABASE_URLS) every shard is migrated, the first one is the default
+from database import DATABASE_URLS
+DATABASE_URL = DATABASE_URLS[0]
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -34,8 +37,18 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 # Import your Base here
 from models import Base  # Adjust path if needed
+from migration_helpers import CHECKPOINT_TABLE
 target_metadata = Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave out objects managed by hand in migrations, like the farmer search index and the
+    backfill checkpoints of migration_helpers.py."""
+    if type_ == "table" and reflected and (name.startswith("farmers_fts") or name == CHECKPOINT_TABLE):
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -58,6 +71,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -73,19 +87,25 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
+    for url in DATABASE_URLS:
+        config.set_main_option("sqlalchemy.url", url)
+        connectable = engine_from_config(
+            config.get_section(config.config_ini_section, {}),
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        if len(DATABASE_URLS) > 1:
+            logging.getLogger("alembic.env").info("Migrating shard %s", connectable.url)
+
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata,
+                include_object=include_object,
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
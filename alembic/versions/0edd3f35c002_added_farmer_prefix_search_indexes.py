@@ -0,0 +1,41 @@
+"""added farmer prefix search indexes
+
+Revision ID: 0edd3f35c002
+Revises: 4d9c2a61e8b5
+Create Date: 2026-02-16 10:04:31.527190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0edd3f35c002'
+down_revision: Union[str, Sequence[str], None] = '4d9c2a61e8b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GET /farmers/search without the sqlite full text index matches lower(name), lower(email)
+    # and phoneNumber against a 'term%' pattern. postgres only uses a b-tree for LIKE when it
+    # compares bytes, so these indexes use text_pattern_ops instead of the column collation
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute('CREATE INDEX ix_farmers_name_lower_pattern ON farmers (lower(name) text_pattern_ops)')
+    op.execute('CREATE INDEX ix_farmers_email_lower_pattern ON farmers (lower(email) text_pattern_ops)')
+    op.execute('CREATE INDEX "ix_farmers_phoneNumber_pattern" ON farmers ("phoneNumber" text_pattern_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute('DROP INDEX IF EXISTS "ix_farmers_phoneNumber_pattern"')
+    op.execute('DROP INDEX IF EXISTS ix_farmers_email_lower_pattern')
+    op.execute('DROP INDEX IF EXISTS ix_farmers_name_lower_pattern')
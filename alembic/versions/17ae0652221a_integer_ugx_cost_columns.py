@@ -0,0 +1,75 @@
+"""integer ugx cost columns
+
+Revision ID: 17ae0652221a
+Revises: 995ff8610c5b
+Create Date: 2026-02-10 11:36:05.219730
+
+Costs are first rounded to whole shillings with batched backfills, which keep API writes
+going. The column type change that follows can not be batched: SQLite copies each table
+and PostgreSQL rewrites it, holding the table's write lock (ACCESS EXCLUSIVE on PostgreSQL)
+for the whole copy. Expect writes to planned_activities and actual_activities to block for
+about as long as a full copy of each table takes, so schedule this revision for a
+maintenance window on large data; the rollup tables have one row per farm or farmer.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from migration_helpers import Backfill, run_backfill
+
+
+# revision identifiers, used by Alembic.
+revision: str = '17ae0652221a'
+down_revision: Union[str, Sequence[str], None] = '995ff8610c5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# UGX has no minor unit, costs are stored as whole shillings
+COST_COLUMNS = [
+    ('planned_activities', 'id', 'estimatedCostUgx', sa.NUMERIC(precision=12, scale=2)),
+    ('actual_activities', 'id', 'actualCostUgx', sa.NUMERIC(precision=12, scale=2)),
+    ('farm_stats', 'farmId', 'estimatedCostUgx', sa.NUMERIC(precision=14, scale=2)),
+    ('farm_stats', 'farmId', 'actualCostUgx', sa.NUMERIC(precision=14, scale=2)),
+    ('farmer_stats', 'farmerId', 'estimatedCostUgx', sa.NUMERIC(precision=14, scale=2)),
+    ('farmer_stats', 'farmerId', 'actualCostUgx', sa.NUMERIC(precision=14, scale=2)),
+]
+
+# round first, the type change itself truncates on sqlite
+ROUNDING_BACKFILLS = [
+    Backfill(
+        name=f"17ae0652221a_round_{table}_{column}",
+        table=table,
+        key=key,
+        sql=f'UPDATE {table} SET "{column}" = ROUND("{column}") '
+            f'WHERE "{column}" != ROUND("{column}") AND "{key}" > :lower AND "{key}" <= :upper',
+    )
+    for table, key, column, numeric_type in COST_COLUMNS
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # every backfill commits its own batches, run them all before any schema change so a
+    # resumed run only repeats rounding
+    for backfill in ROUNDING_BACKFILLS:
+        run_backfill(backfill)
+
+    for table, key, column, numeric_type in COST_COLUMNS:
+        # batch mode rebuilds the table on sqlite, which can not alter column types
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column,
+                       existing_type=numeric_type,
+                       type_=sa.BigInteger(),
+                       existing_nullable=False,
+                       postgresql_using=f'"{column}"::bigint')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, key, column, numeric_type in reversed(COST_COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column,
+                       existing_type=sa.BigInteger(),
+                       type_=numeric_type,
+                       existing_nullable=False)
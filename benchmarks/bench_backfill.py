@@ -0,0 +1,86 @@
+"""Benchmark a farmers backfill: one UPDATE statement vs migration_helpers batches.
+
+Builds a throwaway SQLite database with --rows farmers whose gender is NULL, prints the
+dry-run estimate of the batched backfill, then fills gender:
+
+- single: one UPDATE over the whole table, which holds the write lock for its whole run
+- batched: Backfill batches of --batch-size rows with --pause-ms between them, each batch
+  holding the lock only for its own short transaction
+
+usage: python benchmarks/bench_backfill.py [--rows 1000000] [--batch-size 5000] [--pause-ms 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from sqlalchemy import create_engine, event, insert, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migration_helpers import Backfill, backfill_in_batches, estimate_backfill  # noqa: E402
+from models import Base, Farmer  # noqa: E402
+
+
+SQL = 'UPDATE farmers SET "gender" = \'UNKNOWN\' WHERE "gender" IS NULL AND id > :lower AND id <= :upper'
+
+
+def seed(engine, rows: int):
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Farmer),
+            [
+                {"name": f"Farmer {i}", "phoneNumber": f"07{i:08d}", "hashedPassword": "x", "createdAt": date(2026, 1, 1)}
+                for i in range(rows)
+            ],
+        )
+
+
+def reset(engine):
+    with engine.begin() as connection:
+        connection.execute(text('UPDATE farmers SET "gender" = NULL'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause-ms", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine, tables=[Farmer.__table__])
+
+        print(f"seeding {args.rows} farmers...")
+        seed(engine, args.rows)
+        backfill = Backfill("bench_gender", "farmers", SQL, batch_size=args.batch_size, pause_ms=args.pause_ms)
+
+        estimate = estimate_backfill(engine, backfill)
+        print(f"estimate: {estimate['batches']} batches, {estimate['avgBatchMs']} ms per batch, about {estimate['estimatedSeconds']}s")
+
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(backfill.sql, {"lower": -1, "upper": sys.maxsize})
+        single = time.perf_counter() - start
+        reset(engine)
+
+        # time each batch transaction through the engine events
+        batch_timings = []
+
+        @event.listens_for(engine, "begin")
+        def on_begin(connection):
+            connection.info["started"] = time.perf_counter()
+
+        @event.listens_for(engine, "commit")
+        def on_commit(connection):
+            batch_timings.append(time.perf_counter() - connection.info.pop("started"))
+
+        start = time.perf_counter()
+        backfill_in_batches(engine, backfill)
+        batched = time.perf_counter() - start
+
+        print(f"single UPDATE:  {single * 1000:10.1f} ms, lock held {single * 1000:.1f} ms")
+        print(f"batched:        {batched * 1000:10.1f} ms, longest lock held {max(batch_timings) * 1000:.1f} ms over {len(batch_timings)} transactions")
+        engine.dispose()
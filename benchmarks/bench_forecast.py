@@ -0,0 +1,123 @@
+"""Benchmark season forecasts: a Python loop over the activity rows vs cached NumPy columns.
+
+Builds a throwaway SQLite database with --rows planned activities (and as many actual
+activities) of one crop, spread over farms of different sizes and --season-names season
+names, and times:
+
+- loop: querying the season's activities and averaging costs per acre and target dates per
+  activity type in a Python loop, as a forecast without forecasting.py would
+- load: forecasting.load_history reading the crop's whole history into columns, which
+  runs in a background thread once per FORECAST_CACHE_TTL_SECONDS
+- forecast: forecasting.forecast on the cached columns, the cost of a create_season call
+
+usage: python benchmarks/bench_forecast.py [--rows 1000000] [--season-names 4] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forecasting import forecast, load_history  # noqa: E402
+from models import Base, Farmer, Farm, SeasonPlan, PlannedActivity, ActualActivity, StatusType  # noqa: E402
+
+
+ACTIVITY_TYPES = ["LAND_PREPARATION", "PLANTING", "WEEDING", "SPRAYING", "HARVEST"]
+ACTIVITIES_PER_SEASON = 10
+
+
+def seed(engine, rows: int, season_names: int):
+    seasons = rows // ACTIVITIES_PER_SEASON
+    start = date(2026, 3, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(Farmer), [{"name": "Farmer", "phoneNumber": "0700000000", "hashedPassword": "x", "createdAt": start}])
+        connection.execute(
+            insert(Farm),
+            [{"farmerId": 1, "name": f"Farm {i}", "sizeAcres": random.choice([0.5, 1, 2, 5, 10])} for i in range(seasons)],
+        )
+        connection.execute(
+            insert(SeasonPlan),
+            [{"farmId": i + 1, "cropName": "Maize", "seasonName": f"2026{i % season_names}"} for i in range(seasons)],
+        )
+        planned = [
+            {
+                "seasonPlanId": i // ACTIVITIES_PER_SEASON + 1,
+                "activityType": ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)],
+                "targetDate": start + timedelta(days=random.randrange(120)),
+                "estimatedCostUgx": random.randrange(10_000, 500_000),
+                "status": StatusType.UPCOMING,
+            }
+            for i in range(rows)
+        ]
+        connection.execute(insert(PlannedActivity), planned)
+        connection.execute(
+            insert(ActualActivity),
+            [
+                {
+                    "seasonPlanId": a["seasonPlanId"],
+                    "activityType": a["activityType"],
+                    "actualDate": a["targetDate"],
+                    "actualCostUgx": a["estimatedCostUgx"] + random.randrange(-5_000, 5_000),
+                }
+                for a in planned
+            ],
+        )
+
+
+def forecast_loop(engine, season_name: str, size_acres: float) -> int:
+    with Session(engine) as db:
+        seasons = set()
+        costs = defaultdict(float)
+        dates = defaultdict(list)
+        for season_id, acres, activity_type, target_date, cost in db.execute(
+            select(SeasonPlan.id, Farm.sizeAcres, PlannedActivity.activityType, PlannedActivity.targetDate, PlannedActivity.estimatedCostUgx)
+            .join(SeasonPlan, PlannedActivity.seasonPlanId == SeasonPlan.id)
+            .join(Farm, SeasonPlan.farmId == Farm.id)
+            .where(SeasonPlan.cropName == "Maize", SeasonPlan.seasonName == season_name)
+        ):
+            seasons.add(season_id)
+            costs[activity_type] += cost / float(acres)
+            dates[activity_type].append(target_date.toordinal())
+        for activity_type in dates:
+            date.fromordinal(round(sum(dates[activity_type]) / len(dates[activity_type])))
+        return round(sum(costs.values()) / len(seasons) * size_acres)
+
+
+def best_of(repeat: int, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--season-names", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        seed(engine, args.rows, args.season_names)
+
+        loop, loop_total = best_of(1, forecast_loop, engine, "20260", 3.0)
+        with Session(engine) as db:
+            load, history = best_of(1, load_history, db, "Maize")
+        vectorized, result = best_of(args.repeat, forecast, history, "20260", 3.0, date.today())
+
+        print(f"{args.rows} planned and {args.rows} actual activities, {args.season_names} season names")
+        print(f"loop:      {loop * 1000:10.1f} ms  estimated {loop_total:,} UGX")
+        print(f"load:      {load * 1000:10.1f} ms  (once per cache refresh)")
+        print(f"forecast:  {vectorized * 1000:10.1f} ms  estimated {result['projectedEstimatedCostUgx']:,} UGX")
+        engine.dispose()
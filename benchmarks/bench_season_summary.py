@@ -0,0 +1,91 @@
+"""Benchmark season summary cost totals: Numeric columns summed in Python vs integer SQL sums.
+
+Builds a throwaway SQLite database with one season holding --rows planned activities, stored
+once with the old Numeric(12, 2) cost column and once with the BigInteger column, and times:
+
+- before: loading the season's activities through the ORM and summing Decimal costs in
+  Python, which is what get_season_summary used to do
+- after: a single SUM() over the integer column in the database
+
+usage: python benchmarks/bench_season_summary.py [--rows 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import BigInteger, Integer, Numeric, create_engine, func, insert, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class NumericActivity(Base):
+    __tablename__ = "numeric_activities"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seasonPlanId: Mapped[int] = mapped_column(Integer, index=True)
+    estimatedCostUgx: Mapped[float] = mapped_column(Numeric(12, 2))
+
+
+class IntegerActivity(Base):
+    __tablename__ = "integer_activities"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seasonPlanId: Mapped[int] = mapped_column(Integer, index=True)
+    estimatedCostUgx: Mapped[int] = mapped_column(BigInteger)
+
+
+def seed(engine, rows: int):
+    costs = [random.randrange(1_000, 5_000_000) for _ in range(rows)]
+    with engine.begin() as connection:
+        for model in (NumericActivity, IntegerActivity):
+            connection.execute(insert(model), [{"seasonPlanId": 1, "estimatedCostUgx": cost} for cost in costs])
+    return sum(costs)
+
+
+def total_before(engine) -> int:
+    with Session(engine) as db:
+        activities = db.query(NumericActivity).filter(NumericActivity.seasonPlanId == 1).all()
+        return sum([a.estimatedCostUgx for a in activities])
+
+
+def total_after(engine) -> int:
+    with Session(engine) as db:
+        return db.scalar(
+            select(func.coalesce(func.sum(IntegerActivity.estimatedCostUgx), 0))
+            .where(IntegerActivity.seasonPlanId == 1)
+        )
+
+
+def best_of(repeat: int, fn, engine):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(engine)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+
+        print(f"seeding {args.rows} activities...")
+        expected = seed(engine, args.rows)
+
+        before, before_total = best_of(args.repeat, total_before, engine)
+        after, after_total = best_of(args.repeat, total_after, engine)
+
+        print(f"before (ORM + Decimal sum): {before * 1000:10.1f} ms  total={before_total}")
+        print(f"after  (integer SQL sum):   {after * 1000:10.1f} ms  total={after_total}")
+        print(f"speedup: {before / after:.0f}x, totals match: {before_total == after_total == expected}")
+        engine.dispose()
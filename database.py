@@ -1,21 +1,157 @@
-# database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
+from fastapi import Request
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session
+from dependencies import peek_farmer_id
+from models import Farmer, FarmerDirectory
+from utils import settings
+from write_queue import run_write
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
-# Use SQLite database
 DATABASE_URL = "sqlite:///./sqlitedb.db"
 
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-    echo=True
-)
+# Optional sharding: when SHARD_DATABASE_URLS lists several databases, every farmer and
+# everything hanging off it (farms, seasons, activities) lives on one shard. The first
+# shard also holds the farmer directory, which hands out global farmer ids and records
+# the shard of each farmer.
+DATABASE_URLS = [url.strip() for url in settings.SHARD_DATABASE_URLS.split(",") if url.strip()] or [DATABASE_URL]
+SHARDING_ENABLED = len(DATABASE_URLS) > 1
+
+
+def _create_engine(url: str) -> Engine:
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+        echo=True
+    )
+
+
+engines = [_create_engine(url) for url in DATABASE_URLS]
+engine = engines[0]
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-def get_db():
-    db = SessionLocal()
+# farmer id -> shard index, filled from the directory as farmers are looked up
+_farmer_shards: dict[int, int] = {}
+
+
+def shard_for_farmer(farmer_id: int) -> int:
+    """Return the index of the shard holding the given farmer."""
+    if not SHARDING_ENABLED:
+        return 0
+    if farmer_id not in _farmer_shards:
+        with SessionLocal() as db:
+            shard = db.scalar(select(FarmerDirectory.shard).where(FarmerDirectory.id == farmer_id))
+        if shard is None:
+            # unknown farmer, the request will fail its own lookups on the default placement
+            return farmer_id % len(engines)
+        _farmer_shards[farmer_id] = shard
+    return _farmer_shards[farmer_id]
+
+
+def bind_to_farmer(db: Session, farmer_id: int):
+    """Point a session at the shard owning the farmer. Ends the session's current transaction."""
+    if not SHARDING_ENABLED:
+        return
+    db.rollback()
+    db.bind = engines[shard_for_farmer(farmer_id)]
+
+
+def register_farmer(db: Session, phone_number: str, email: str | None, create: Callable[[Session, int], T]) -> T:
+    """Give a new farmer a global id and a shard in the directory, and create the farmer on
+    that shard with create(session, farmer_id).
+
+    db must be bound to the first shard. Farmers are spread over the shards by id. The
+    directory entry is committed only once the farmer is, in the same transaction when the
+    farmer lands on the first shard, so a failed create never leaves its phone number or
+    email reserved.
+    """
+    entry = FarmerDirectory(phoneNumber=phone_number, email=email, shard=0)
+    try:
+        db.add(entry)
+        db.flush()
+        entry.shard = entry.id % len(engines)
+        if entry.shard == 0:
+            farmer = create(db, entry.id)
+        else:
+            # the farmer is returned after its session closes, keep it loaded
+            with SessionLocal(bind=engines[entry.shard], expire_on_commit=False) as shard_db:
+                farmer = run_write(shard_db, partial(create, farmer_id=entry.id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    _farmer_shards[entry.id] = entry.shard
+    return farmer
+
+
+def sync_farmer_directory():
+    """Bring the directory in line with the farmers tables of every shard: add entries for
+    farmers created while sharding was off, and drop entries whose farmer does not exist."""
+    with SessionLocal() as db:
+        directory = {
+            farmer_id: shard for farmer_id, shard in db.execute(select(FarmerDirectory.id, FarmerDirectory.shard))
+        }
+        missing = []
+        found = set()
+        for shard, shard_engine in enumerate(engines):
+            with SessionLocal(bind=shard_engine) as shard_db:
+                for farmer_id, phone_number, email in shard_db.execute(select(Farmer.id, Farmer.phoneNumber, Farmer.email)):
+                    found.add(farmer_id)
+                    if farmer_id not in directory:
+                        missing.append({"id": farmer_id, "phoneNumber": phone_number, "email": email, "shard": shard})
+
+        orphaned = [farmer_id for farmer_id in directory if farmer_id not in found]
+        if orphaned:
+            db.execute(delete(FarmerDirectory).where(FarmerDirectory.id.in_(orphaned)))
+        if missing:
+            # another process may have registered some of them since the directory was read
+            registered = set(db.scalars(
+                select(FarmerDirectory.id).where(FarmerDirectory.id.in_([entry["id"] for entry in missing]))
+            ))
+            missing = [entry for entry in missing if entry["id"] not in registered]
+        if missing:
+            db.execute(insert(FarmerDirectory), missing)
+        db.commit()
+    if missing or orphaned:
+        logger.warning("farmer directory: added %s farmers, removed %s entries without a farmer", len(missing), len(orphaned))
+
+
+def scatter_gather(db: Session, query: Callable[[Session], list]) -> list:
+    """Run a read query on every shard in parallel and concatenate the results.
+
+    Without sharding the query simply runs on the given session.
+    """
+    if not SHARDING_ENABLED:
+        return query(db)
+
+    def run(shard_engine: Engine) -> list:
+        with SessionLocal(bind=shard_engine) as shard_db:
+            return query(shard_db)
+
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        results = pool.map(run, engines)
+    return [row for rows in results for row in rows]
+
+
+def get_db(request: Request = None):
+    # bind the session to the shard of the authenticated farmer, if any
+    bind = engine
+    if SHARDING_ENABLED and request is not None:
+        farmer_id = peek_farmer_id(request.headers.get("token"))
+        if farmer_id is not None:
+            bind = engines[shard_for_farmer(farmer_id)]
+
+    db = SessionLocal(bind=bind)
     try:
         yield db
     finally:
@@ -29,4 +29,23 @@ async def decode_jwt(auth_header: str) -> int:
 
 async def verify_token(token: Annotated[str, Header()]) -> int:
     farmer_id = await decode_jwt(token)
-    return int(farmer_id)
\ No newline at end of file
+    return int(farmer_id)
+
+async def verify_optional_token(token: Annotated[str | None, Header()] = None) -> int | None:
+    """Like verify_token, for endpoints that admins can also call without a token."""
+    if token is None:
+        return None
+    farmer_id = await decode_jwt(token)
+    return int(farmer_id)
+
+def peek_farmer_id(auth_header: str | None) -> int | None:
+    """Read the farmer id from a token header without raising. Used for routing a request
+    to its database shard only; verify_token still authenticates the request."""
+    if not auth_header:
+        return None
+    token = auth_header.split()[-1]
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        return int(payload.get("sub"))
+    except (jwt.PyJWTError, TypeError, ValueError):
+        return None
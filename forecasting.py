@@ -0,0 +1,294 @@
+"""Season cost and schedule forecasts from the history of other farms.
+
+When a season is created, the planned and actual activities of every earlier season with
+the same crop and season name are averaged per activity type and scaled to the size of the
+new season's farm: costs are taken per acre and multiplied by the farm's acres. A past
+season starts on its earliest planned target date. The new season starts on the usual day of
+the year of those starts, in the occurrence nearest to today, and each activity type is
+scheduled at its average offset from the start of its past seasons.
+
+A crop's history is loaded in bulk into NumPy columns, with activity types and season names
+encoded as integers, so a forecast is a handful of masked bincounts rather than a loop over
+activities. Histories are loaded by a single background thread, for every crop when the app
+starts and for a new crop on its first forecast, and are reloaded once they are older than
+FORECAST_CACHE_TTL_SECONDS. At most FORECAST_CACHE_MAX_CROPS histories are kept. A forecast never waits on the database: while a crop's history
+is first loading, its seasons are created without a forecast.
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy import Float, String, cast, func, select, type_coerce
+from sqlalchemy.orm import Session
+from database import SessionLocal, scatter_gather
+from dependencies import nairobi_tz
+from models import Farm, SeasonPlan, PlannedActivity, ActualActivity
+from utils import settings
+
+
+logger = logging.getLogger(__name__)
+
+YEAR_DAYS = 365.25
+
+
+class CropHistory(NamedTuple):
+    """Activities of every season of one crop on farms with a known size, as columns."""
+    activityTypes: np.ndarray  # type code -> activity type
+    seasonNames: dict[str, int]  # season name -> season code
+    seasonCounts: np.ndarray  # season code -> seasons with planned activities
+    startSeason: np.ndarray  # one entry per season with planned activities
+    startDayOfYear: np.ndarray
+    plannedSeason: np.ndarray
+    plannedType: np.ndarray
+    plannedOffset: np.ndarray  # days from the start of the activity's season
+    plannedCostPerAcre: np.ndarray
+    actualSeason: np.ndarray
+    actualType: np.ndarray
+    actualCostPerAcre: np.ndarray
+    loadedAt: float
+
+
+def load_history(db: Session, crop_name: str) -> CropHistory:
+    """Load the planned and actual activities of all seasons of a crop, on every shard."""
+    acres = cast(Farm.sizeAcres, Float)
+    # a season starts on its earliest planned target date
+    starts = (
+        select(PlannedActivity.seasonPlanId.label("seasonPlanId"), func.min(PlannedActivity.targetDate).label("start"))
+        .group_by(PlannedActivity.seasonPlanId)
+        .subquery()
+    )
+    # plain core results, the orm layer would double the load time of a large history.
+    # dates are read as raw ISO strings on SQLite, numpy parses them far faster than one
+    # date() per row
+    planned = scatter_gather(db, lambda shard_db: shard_db.connection().execute(
+        select(
+            SeasonPlan.seasonName,
+            PlannedActivity.activityType,
+            type_coerce(PlannedActivity.targetDate, String),
+            type_coerce(starts.c.start, String),
+            PlannedActivity.estimatedCostUgx / acres,
+        )
+        .join(SeasonPlan, PlannedActivity.seasonPlanId == SeasonPlan.id)
+        .join(starts, starts.c.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(SeasonPlan.cropName == crop_name, Farm.sizeAcres > 0)
+    ).all())
+    actual = scatter_gather(db, lambda shard_db: shard_db.connection().execute(
+        select(
+            SeasonPlan.seasonName,
+            ActualActivity.activityType,
+            ActualActivity.actualCostUgx / acres,
+        )
+        .join(SeasonPlan, ActualActivity.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(SeasonPlan.cropName == crop_name, Farm.sizeAcres > 0)
+    ).all())
+    # seasons with a plan, averages are taken over these
+    season_starts = scatter_gather(db, lambda shard_db: shard_db.connection().execute(
+        select(SeasonPlan.seasonName, type_coerce(starts.c.start, String))
+        .join(starts, starts.c.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(SeasonPlan.cropName == crop_name, Farm.sizeAcres > 0)
+    ).all())
+
+    planned_columns = list(zip(*planned)) or [(), (), (), (), ()]
+    actual_columns = list(zip(*actual)) or [(), (), ()]
+    start_columns = list(zip(*season_starts)) or [(), ()]
+
+    # encode activity types and season names as integer codes, shared by both tables
+    activity_types = sorted(set(planned_columns[1]) | set(actual_columns[1]))
+    type_codes = {name: code for code, name in enumerate(activity_types)}
+    season_names = sorted(set(start_columns[0]) | set(planned_columns[0]) | set(actual_columns[0]))
+    season_codes = {name: code for code, name in enumerate(season_names)}
+
+    def encode(codes: dict[str, int], names) -> np.ndarray:
+        return np.fromiter((codes[name] for name in names), dtype=np.int32, count=len(names))
+
+    def days(dates) -> np.ndarray:
+        return np.array(dates, dtype="datetime64[D]")
+
+    start_season = encode(season_codes, start_columns[0])
+    start_dates = days(start_columns[1])
+
+    return CropHistory(
+        activityTypes=np.array(activity_types, dtype=str),
+        seasonNames=season_codes,
+        seasonCounts=np.bincount(start_season, minlength=len(season_names)),
+        startSeason=start_season,
+        startDayOfYear=(start_dates - start_dates.astype("datetime64[Y]")).astype(np.int64),
+        plannedSeason=encode(season_codes, planned_columns[0]),
+        plannedType=encode(type_codes, planned_columns[1]),
+        plannedOffset=(days(planned_columns[2]) - days(planned_columns[3])).astype(np.int64),
+        plannedCostPerAcre=np.array(planned_columns[4], dtype=np.float64),
+        actualSeason=encode(season_codes, actual_columns[0]),
+        actualType=encode(type_codes, actual_columns[1]),
+        actualCostPerAcre=np.array(actual_columns[2], dtype=np.float64),
+        loadedAt=time.monotonic(),
+    )
+
+
+def season_start(start_days_of_year: np.ndarray, today: date) -> date:
+    """The occurrence nearest to today of the usual start day of a season. Days of the year
+    are averaged on a circle, so starts around new year average to new year."""
+    angles = start_days_of_year * (2 * math.pi / YEAR_DAYS)
+    mean_angle = math.atan2(np.sin(angles).mean(), np.cos(angles).mean()) % (2 * math.pi)
+    day_of_year = round(mean_angle * YEAR_DAYS / (2 * math.pi)) % 365
+    candidates = [date(year, 1, 1) + timedelta(days=day_of_year) for year in (today.year - 1, today.year, today.year + 1)]
+    return min(candidates, key=lambda candidate: abs(candidate - today))
+
+
+def forecast(history: CropHistory, season_name: str, size_acres: float, today: date) -> dict | None:
+    """Project the costs and schedule of a season of size_acres from the crop's history of
+    seasons with the same name. None when there is no such history."""
+    season = history.seasonNames.get(season_name)
+    if season is None or not history.seasonCounts[season]:
+        return None
+    seasons = int(history.seasonCounts[season])
+    type_count = len(history.activityTypes)
+    start = season_start(history.startDayOfYear[history.startSeason == season], today)
+
+    planned = history.plannedSeason == season
+    planned_type = history.plannedType[planned]
+    occurrences = np.bincount(planned_type, minlength=type_count)
+    # average cost per acre of an activity type per season, seasons without it count as 0
+    estimated = np.bincount(planned_type, weights=history.plannedCostPerAcre[planned], minlength=type_count) / seasons
+    offset_sums = np.bincount(planned_type, weights=history.plannedOffset[planned], minlength=type_count)
+
+    actual = history.actualSeason == season
+    actual_cost = np.bincount(
+        history.actualType[actual], weights=history.actualCostPerAcre[actual], minlength=type_count
+    ) / seasons
+
+    scheduled = np.flatnonzero(occurrences)
+    offsets = np.rint(offset_sums[scheduled] / occurrences[scheduled]).astype(np.int64)
+    order = np.lexsort((history.activityTypes[scheduled], offsets))
+    estimated_costs = np.rint(estimated * size_acres).astype(np.int64)
+    actual_costs = np.rint(actual_cost * size_acres).astype(np.int64)
+
+    return {
+        "basedOnSeasons": seasons,
+        "sizeAcres": size_acres,
+        "startDate": start,
+        "projectedEstimatedCostUgx": int(estimated_costs.sum()),
+        "projectedActualCostUgx": int(actual_costs.sum()),
+        "activities": [
+            {
+                "activityType": str(history.activityTypes[code]),
+                "targetDate": start + timedelta(days=int(offset)),
+                "activitiesPerSeason": round(float(occurrences[code]) / seasons, 2),
+                "estimatedCostUgx": int(estimated_costs[code]),
+                "actualCostUgx": int(actual_costs[code]),
+            }
+            for code, offset in zip(scheduled[order], offsets[order])
+        ],
+    }
+
+
+# queued in place of a crop name to load the histories of every crop
+_WARM = object()
+
+
+class ForecastCache:
+    """Crop histories kept for ttl_seconds, at most max_crops of them, least recently used
+    first out. Histories are only ever loaded by one background thread, a crop without a
+    loaded history has no forecast until its load finishes."""
+
+    def __init__(self, ttl_seconds: float, max_crops: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_crops = max_crops
+        self._histories: OrderedDict[str, CropHistory] = OrderedDict()
+        # crop names queued or being loaded
+        self._pending: set[str] = set()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def get(self, crop_name: str) -> CropHistory | None:
+        """Return the crop's history, None while it is first loaded. Stale histories are
+        returned while a fresh one loads."""
+        with self._lock:
+            history = self._histories.get(crop_name)
+            if history is not None:
+                self._histories.move_to_end(crop_name)
+        if history is None or time.monotonic() - history.loadedAt > self.ttl_seconds:
+            self._schedule([crop_name])
+        return history
+
+    def warm(self):
+        """Load the histories of every crop in the background."""
+        self._ensure_started()
+        self._queue.put(_WARM)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="forecast-refresh", daemon=True)
+                self._thread.start()
+
+    def _schedule(self, crop_names: list[str]):
+        """Queue loads of crops not queued already. Loads beyond max_crops would only evict
+        each other, so the queue holds at most that many."""
+        with self._lock:
+            room = max(0, self.max_crops - len(self._pending))
+            crop_names = [crop_name for crop_name in crop_names if crop_name not in self._pending][:room]
+            self._pending.update(crop_names)
+        if crop_names:
+            self._ensure_started()
+        for crop_name in crop_names:
+            self._queue.put(crop_name)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _WARM:
+                self._warm()
+            else:
+                self._refresh(item)
+
+    def _warm(self):
+        try:
+            with SessionLocal() as db:
+                crop_names = set(scatter_gather(
+                    db, lambda shard_db: shard_db.scalars(select(SeasonPlan.cropName).distinct()).all()
+                ))
+        except Exception:
+            logger.exception("could not list crops to warm the forecast cache")
+            return
+        self._schedule(sorted(crop_names))
+
+    def _refresh(self, crop_name: str):
+        try:
+            started = time.perf_counter()
+            with SessionLocal() as db:
+                history = load_history(db, crop_name)
+            with self._lock:
+                self._histories[crop_name] = history
+                self._histories.move_to_end(crop_name)
+                while len(self._histories) > self.max_crops:
+                    self._histories.popitem(last=False)
+            logger.info(
+                "loaded %s history: %s planned, %s actual activities in %.0f ms", crop_name,
+                len(history.plannedType), len(history.actualType), (time.perf_counter() - started) * 1000,
+            )
+        except Exception:
+            logger.exception("could not load %s history", crop_name)
+        finally:
+            with self._lock:
+                self._pending.discard(crop_name)
+
+
+forecast_cache = ForecastCache(settings.FORECAST_CACHE_TTL_SECONDS, settings.FORECAST_CACHE_MAX_CROPS)
+
+
+def forecast_season(crop_name: str, season_name: str, size_acres: float) -> dict | None:
+    """Forecast a new season, None when there is no history or the crop's is still loading."""
+    history = forecast_cache.get(crop_name)
+    if history is None:
+        return None
+    today = datetime.now(nairobi_tz).date()
+    return forecast(history, season_name, size_acres, today)
@@ -0,0 +1,100 @@
+"""Chunked reading of NDJSON request bodies for the streaming ingestion endpoints.
+
+The body is read as it arrives and split into lines, and each line is parsed and validated
+on its own. Valid rows are handed out in chunks of INGEST_CHUNK_SIZE, so memory stays
+bounded by the chunk size and the longest accepted line, however large the body is.
+"""
+import json
+from typing import AsyncIterator, TypeVar
+from pydantic import BaseModel, ValidationError
+from utils import settings
+
+
+M = TypeVar("M", bound=BaseModel)
+
+# rejected rows reported back in full, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class IngestSummary:
+    """Accepted and rejected row counts of a streaming ingestion, with line numbered errors."""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.chunks = 0
+        self.errors: list[dict] = []
+        # first line of the chunk that could not be saved, nothing after it was read
+        self.failedFromLine: int | None = None
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def fail(self, line: int):
+        self.failedFromLine = line
+
+    def as_dict(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "errorsTruncated": self.rejected > len(self.errors),
+            "failedFromLine": self.failedFromLine,
+        }
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+    )
+
+
+async def _lines(stream: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, bytes | None]]:
+    """Yield (line number, line) for each line of the body. Lines longer than max_line_bytes
+    are skipped while being read and yielded as None."""
+    buffer = b""
+    line_number = 1
+    too_long = False
+    async for data in stream:
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            yield line_number, None if too_long or len(line) > max_line_bytes else line
+            line_number += 1
+            too_long = False
+        # drop the start of an overlong line instead of buffering it
+        if len(buffer) > max_line_bytes:
+            too_long = True
+            buffer = b""
+    if buffer or too_long:
+        yield line_number, None if too_long else buffer
+
+
+async def ndjson_chunks(
+    stream: AsyncIterator[bytes], model: type[M], summary: IngestSummary
+) -> AsyncIterator[list[tuple[int, M]]]:
+    """Parse an NDJSON body into chunks of (line number, validated row). Rows that fail to
+    parse or validate are recorded in summary and left out. Blank lines are ignored."""
+    chunk: list[tuple[int, M]] = []
+    async for line_number, line in _lines(stream, settings.INGEST_MAX_LINE_BYTES):
+        if line is None:
+            summary.reject(line_number, f"line longer than {settings.INGEST_MAX_LINE_BYTES} bytes")
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = model.model_validate(json.loads(line))
+        except ValidationError as e:
+            summary.reject(line_number, _validation_error(e))
+            continue
+        except ValueError:
+            summary.reject(line_number, "invalid JSON")
+            continue
+        chunk.append((line_number, row))
+        if len(chunk) >= settings.INGEST_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,210 @@
+"""Background report jobs on a local process pool, with the job queue kept in the database.
+
+Submitting a job inserts a QUEUED row in report_jobs. Every API process runs a dispatcher
+thread (started by the app lifespan) that claims queued jobs with a conditional UPDATE, so
+a job runs once even when several processes share the database, and runs them on a pool of
+REPORT_WORKERS processes. At most REPORT_WORKERS jobs run per process, and submissions are
+refused once REPORT_MAX_QUEUED jobs are waiting or running. Results are written to
+REPORT_DIR.
+
+A job left RUNNING by a process that died is marked FAILED once it is older than
+REPORT_JOB_TIMEOUT_SECONDS, so the timeout must be longer than the slowest report. Jobs
+still running when the app shuts down are put back in the queue.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from multiprocessing import get_context
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from database import DATABASE_URLS, SessionLocal
+from dependencies import nairobi_tz
+from models import JobStatus, ReportJob
+from season_reports import generate_season_report
+from utils import settings
+
+
+logger = logging.getLogger(__name__)
+
+# job kind -> function run in a worker process as fn(database_urls, params, format, path)
+KINDS = {
+    "season_summary": generate_season_report,
+}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def report_path(job: ReportJob) -> str:
+    return os.path.join(settings.REPORT_DIR, f"report-{job.id}.{job.format}")
+
+
+def submit_job(db: Session, kind: str, report_format: str, params: dict, farmer_id: int | None) -> ReportJob:
+    """Queue a job. db must be bound to the first shard, which holds the job table."""
+    pending = db.scalar(
+        select(func.count()).select_from(ReportJob).where(ReportJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]))
+    )
+    if pending >= settings.REPORT_MAX_QUEUED:
+        raise JobQueueFull()
+
+    job = ReportJob(kind=kind, format=report_format, params=json.dumps(params), status=JobStatus.QUEUED, farmerId=farmer_id)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if _runner is not None:
+        _runner.wake()
+    return job
+
+
+class JobRunner:
+    """Dispatcher thread feeding queued jobs to a process pool."""
+
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.executor = self._new_executor()
+        # job id -> future of the jobs this process is running
+        self.running: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="report-jobs", daemon=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn rather than fork, the api process has threads and open connections
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+
+    def start(self):
+        os.makedirs(settings.REPORT_DIR, exist_ok=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        # hand unfinished jobs back to the queue
+        with self._lock:
+            job_ids = list(self.running)
+            self.running.clear()
+        if job_ids:
+            with SessionLocal() as db:
+                db.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id.in_(job_ids), ReportJob.status == JobStatus.RUNNING)
+                    .values(status=JobStatus.QUEUED, startedAt=None)
+                )
+                db.commit()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._fail_orphaned()
+                self._dispatch()
+            except Exception:
+                logger.exception("report job dispatch failed")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _fail_orphaned(self):
+        cutoff = datetime.now(nairobi_tz) - timedelta(seconds=settings.REPORT_JOB_TIMEOUT_SECONDS)
+        with self._lock:
+            own = list(self.running)
+        with SessionLocal() as db:
+            db.execute(
+                update(ReportJob)
+                .where(ReportJob.status == JobStatus.RUNNING, ReportJob.startedAt < cutoff, ReportJob.id.not_in(own))
+                .values(status=JobStatus.FAILED, error="Timed out", finishedAt=datetime.now(nairobi_tz))
+            )
+            db.commit()
+
+    def _dispatch(self):
+        with self._lock:
+            free = self.workers - len(self.running)
+        if free <= 0:
+            return
+
+        with SessionLocal() as db:
+            jobs = db.scalars(
+                select(ReportJob).where(ReportJob.status == JobStatus.QUEUED).order_by(ReportJob.id).limit(free)
+            ).all()
+            for job in jobs:
+                # claim the job, another process may be dispatching it too
+                claimed = db.execute(
+                    update(ReportJob)
+                    .where(ReportJob.id == job.id, ReportJob.status == JobStatus.QUEUED)
+                    .values(status=JobStatus.RUNNING, startedAt=datetime.now(nairobi_tz))
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue
+
+                run = KINDS[job.kind]
+                try:
+                    future = self.executor.submit(run, DATABASE_URLS, json.loads(job.params), job.format, report_path(job))
+                except BrokenProcessPool:
+                    # a worker died, start a fresh pool and retry the job on the next round
+                    logger.warning("report worker pool broken, restarting it")
+                    self.executor = self._new_executor()
+                    db.execute(update(ReportJob).where(ReportJob.id == job.id).values(status=JobStatus.QUEUED, startedAt=None))
+                    db.commit()
+                    return
+                except Exception as e:
+                    logger.exception("could not start report job %s", job.id)
+                    db.execute(
+                        update(ReportJob)
+                        .where(ReportJob.id == job.id)
+                        .values(status=JobStatus.FAILED, error=str(e), finishedAt=datetime.now(nairobi_tz))
+                    )
+                    db.commit()
+                    continue
+                with self._lock:
+                    self.running[job.id] = future
+                future.add_done_callback(partial(self._finished, job.id))
+
+    def _finished(self, job_id: int, future: Future):
+        with self._lock:
+            self.running.pop(job_id, None)
+        if future.cancelled():
+            return
+
+        try:
+            values = {"status": JobStatus.DONE, "rowCount": future.result()}
+        except Exception as e:
+            logger.exception("report job %s failed", job_id)
+            values = {"status": JobStatus.FAILED, "error": str(e) or e.__class__.__name__}
+        with SessionLocal() as db:
+            db.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job_id, ReportJob.status == JobStatus.RUNNING)
+                .values(finishedAt=datetime.now(nairobi_tz), **values)
+            )
+            db.commit()
+        self.wake()
+
+
+_runner: JobRunner | None = None
+
+
+def start_job_runner():
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(settings.REPORT_WORKERS, settings.REPORT_POLL_SECONDS)
+        _runner.start()
+
+
+def stop_job_runner():
+    global _runner
+    if _runner is not None:
+        _runner.stop()
+        _runner = None
@@ -3,12 +3,38 @@ from fastapi.middleware.cors import CORSMiddleware
 from routers.farmers.farmers import router as farmers_router
 from routers.farms.farms import router as farms_router
 from routers.seasons.seasons import router as seasons_router
-from sqlalchemy.orm import Session
-from database import get_db
+from routers.activities.activities import router as activities_router
+from routers.admin.admin import router as admin_router
+from routers.reports.reports import router as reports_router
+from database import SHARDING_ENABLED, engines, sync_farmer_directory
 from sqlalchemy import text
+from contextlib import asynccontextmanager
+from write_queue import stop_write_queues
+from jobs import start_job_runner, stop_job_runner
+from forecasting import forecast_cache
+from admission import AdmissionControlMiddleware
+from profiling import ProfilingMiddleware
+from utils import settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # farmers created while sharding was off are added to the farmer directory
+    if SHARDING_ENABLED:
+        sync_farmer_directory()
+    # load the season forecast histories in the background
+    forecast_cache.warm()
+    # run queued report jobs in the background
+    if settings.REPORT_JOBS_ENABLED:
+        start_job_runner()
+    yield
+    stop_job_runner()
+    # commit any queued writes before shutting down
+    stop_write_queues()
 
 
 app = FastAPI(
+    lifespan=lifespan,
     title="EzyAgric Backend API",
     version="0.1.0",
     description="EzyAgric Backend API created by Mujuzi Denis. For testing purposes only. admin-key: admin.123@456",
@@ -17,6 +43,17 @@ app = FastAPI(
 app.include_router(farmers_router)
 app.include_router(farms_router)
 app.include_router(seasons_router)
+app.include_router(activities_router)
+app.include_router(reports_router)
+app.include_router(admin_router)
+
+# on demand request profiling, not installed unless enabled
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# admission control and load shedding for expensive routes
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
 
 # CORS middleware. allowing all origins for now(development purposes)
 app.add_middleware(
@@ -31,11 +68,12 @@ app.add_middleware(
 # check health of the app. currently only check if db is reachable
 @app.get("/health")
 async def health_check():
-    """check health of the app. currently only check if db is reachable"""
+    """check health of the app. currently only check if every db shard is reachable"""
     try:
-        db: Session = next(get_db())
-        # simple query to check db connectivity
-        db.execute(text("SELECT 1"))
+        for shard_engine in engines:
+            # simple query to check db connectivity
+            with shard_engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
         return {"status": "healthy"}
     except Exception as e:
         return {"status": "unhealthy", "detail": str(e)}
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""Batched, resumable backfills for Alembic revisions.
+
+A single UPDATE over a large table holds the write lock for as long as it runs. A Backfill
+instead runs its statement over consecutive ranges of the table's integer key, one short
+transaction per batch, sleeping between batches so API writes get through. After every
+batch the last key done is saved in the migration_checkpoints table, so if the migration
+crashes, running `alembic upgrade head` again resumes after the last committed batch.
+
+The statement restricts itself to the batch with the :lower (exclusive) and :upper
+(inclusive) parameters, and must be safe to run twice on a batch:
+
+    GENDER_BACKFILL = Backfill(
+        name="3c1d9a7e52f0_farmer_gender_backfill",
+        table="farmers",
+        sql='UPDATE farmers SET "gender" = \'UNKNOWN\' WHERE "gender" IS NULL AND id > :lower AND id <= :upper',
+    )
+
+    def upgrade() -> None:
+        run_backfill(GENDER_BACKFILL)
+
+Batches commit on their own, outside the revision's transaction, so keep a backfill in a
+revision of its own after the one changing the schema: a resumed run then does not repeat
+schema changes that were already committed.
+
+To see how long a backfill will take and how long each batch holds the lock, run a few
+batches against a seeded copy of the database and roll them back:
+
+    python migration_helpers.py estimate alembic/versions/3c1d9a7e52f0_farmer_gender_backfill.py
+"""
+import importlib.util
+import logging
+import math
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, column, delete, func, insert, select, table, text, update
+from alembic import op
+from sqlalchemy.engine import Connection, Engine
+from utils import settings
+
+
+logger = logging.getLogger("alembic.backfill")
+
+CHECKPOINT_TABLE = "migration_checkpoints"
+
+# kept out of the models, alembic/env.py leaves it out of autogenerate
+checkpoints = Table(
+    CHECKPOINT_TABLE,
+    MetaData(),
+    Column("name", String(255), primary_key=True),
+    Column("lastKey", Integer, nullable=False),
+    Column("rowsDone", Integer, nullable=False),
+    Column("updatedAt", DateTime, nullable=False),
+)
+
+
+class Backfill:
+    """A statement run over a table in key ranges of batch_size rows."""
+
+    def __init__(self, name: str, table: str, sql: str, key: str = "id", batch_size: int | None = None, pause_ms: int | None = None):
+        self.name = name
+        self.table = table
+        self.sql = text(sql)
+        self.key = key
+        self.batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+        self.pause_ms = settings.MIGRATION_BATCH_PAUSE_MS if pause_ms is None else pause_ms
+
+    def _key_column(self):
+        return column(self.key)
+
+    def _table(self):
+        return table(self.table, self._key_column())
+
+    def first_lower(self, connection: Connection) -> int | None:
+        """The lower bound of the first batch, None if the table is empty."""
+        smallest = connection.scalar(select(func.min(self._key_column())).select_from(self._table()))
+        return None if smallest is None else smallest - 1
+
+    def next_upper(self, connection: Connection, lower: int) -> int | None:
+        """The upper bound of the batch after lower, None when there are no rows left."""
+        key = self._key_column()
+        upper = connection.scalar(
+            select(key).select_from(self._table()).where(key > lower).order_by(key).offset(self.batch_size - 1).limit(1)
+        )
+        if upper is None:
+            # last, partial batch
+            upper = connection.scalar(select(func.max(key)).select_from(self._table()).where(key > lower))
+        return upper
+
+    def count_rows(self, connection: Connection, lower: int) -> int:
+        return connection.scalar(select(func.count()).select_from(self._table()).where(self._key_column() > lower))
+
+
+def _load_checkpoint(connection: Connection, name: str) -> tuple[int, int] | None:
+    row = connection.execute(select(checkpoints.c.lastKey, checkpoints.c.rowsDone).where(checkpoints.c.name == name)).first()
+    return None if row is None else (row.lastKey, row.rowsDone)
+
+
+def _save_checkpoint(connection: Connection, name: str, last_key: int, rows_done: int):
+    values = {"lastKey": last_key, "rowsDone": rows_done, "updatedAt": datetime.now()}
+    result = connection.execute(update(checkpoints).where(checkpoints.c.name == name).values(**values))
+    if result.rowcount == 0:
+        connection.execute(insert(checkpoints).values(name=name, **values))
+
+
+def backfill_in_batches(engine: Engine, backfill: Backfill) -> int:
+    """Run a backfill batch by batch, resuming from its checkpoint. Returns the rows affected."""
+    with engine.connect() as connection:
+        with connection.begin():
+            checkpoints.create(connection, checkfirst=True)
+            checkpoint = _load_checkpoint(connection, backfill.name)
+            if checkpoint is None:
+                lower, rows_done = backfill.first_lower(connection), 0
+            else:
+                lower, rows_done = checkpoint
+                logger.info("%s: resuming after %s = %s", backfill.name, backfill.key, lower)
+            remaining = 0 if lower is None else backfill.count_rows(connection, lower)
+
+        started = time.perf_counter()
+        scanned = 0
+        while remaining and lower is not None:
+            with connection.begin():
+                upper = backfill.next_upper(connection, lower)
+                if upper is None:
+                    break
+                rows_done += connection.execute(backfill.sql, {"lower": lower, "upper": upper}).rowcount
+                _save_checkpoint(connection, backfill.name, upper, rows_done)
+            lower = upper
+            scanned = min(scanned + backfill.batch_size, remaining)
+
+            elapsed = time.perf_counter() - started
+            eta = elapsed / scanned * (remaining - scanned) if scanned else 0
+            logger.info("%s: %s/%s rows scanned, eta %.0fs", backfill.name, scanned, remaining, eta)
+            time.sleep(backfill.pause_ms / 1000)
+
+        # done, a later run of the same revision starts from scratch
+        with connection.begin():
+            connection.execute(delete(checkpoints).where(checkpoints.c.name == backfill.name))
+    logger.info("%s: done, %s rows affected", backfill.name, rows_done)
+    return rows_done
+
+
+def run_backfill(backfill: Backfill):
+    """Run a backfill from an Alembic revision. Offline (--sql) it is emitted as one statement."""
+    context = op.get_context()
+    if context.as_sql:
+        op.execute(backfill.sql.bindparams(lower=-sys.maxsize, upper=sys.maxsize))
+        return
+
+    # commit the revision's transaction so far, each batch then commits on its own
+    with context.autocommit_block():
+        backfill_in_batches(op.get_bind().engine, backfill)
+
+
+def estimate_backfill(engine: Engine, backfill: Backfill, sample_batches: int = 3) -> dict:
+    """Time a few batches of a backfill, roll them back and extrapolate to the whole table."""
+    timings = []
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            lower = backfill.first_lower(connection)
+            rows = 0 if lower is None else backfill.count_rows(connection, lower)
+            while lower is not None and len(timings) < sample_batches:
+                start = time.perf_counter()
+                upper = backfill.next_upper(connection, lower)
+                if upper is None:
+                    break
+                connection.execute(backfill.sql, {"lower": lower, "upper": upper})
+                timings.append(time.perf_counter() - start)
+                lower = upper
+            transaction.rollback()
+
+    batches = math.ceil(rows / backfill.batch_size)
+    batch_seconds = sum(timings) / len(timings) if timings else 0
+    return {
+        "name": backfill.name,
+        "table": backfill.table,
+        "rows": rows,
+        "batchSize": backfill.batch_size,
+        "batches": batches,
+        "sampledBatches": len(timings),
+        "avgBatchMs": round(batch_seconds * 1000, 1),
+        "maxBatchMs": round(max(timings, default=0) * 1000, 1),
+        "pauseMs": backfill.pause_ms,
+        "estimatedSeconds": round(batches * (batch_seconds + backfill.pause_ms / 1000), 1),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "estimate":
+        sys.exit("usage: python migration_helpers.py estimate <revision file>")
+
+    spec = importlib.util.spec_from_file_location("revision", sys.argv[2])
+    revision = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(revision)
+    # the revision imports this file as migration_helpers, not as __main__
+    import migration_helpers
+
+    backfills = [value for value in vars(revision).values() if isinstance(value, migration_helpers.Backfill)]
+    if not backfills:
+        sys.exit(f"no Backfill in {sys.argv[2]}")
+
+    from database import engine
+
+    engine.echo = False
+    for backfill in backfills:
+        estimate = migration_helpers.estimate_backfill(engine, backfill)
+        print(
+            f"{estimate['name']}: {estimate['rows']} rows in {estimate['batches']} batches of {estimate['batchSize']}, "
+            f"{estimate['avgBatchMs']} ms per batch (max {estimate['maxBatchMs']} ms held), "
+            f"about {estimate['estimatedSeconds']}s with {estimate['pauseMs']} ms pauses"
+        )
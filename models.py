@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import String, Integer, Date, Text, ForeignKey, Enum, Numeric
+from sqlalchemy import String, Integer, BigInteger, Date, DateTime, Text, ForeignKey, Enum, Numeric, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from enum import Enum as PyEnum
 from dependencies import nairobi_tz
@@ -16,11 +16,18 @@ class StatusType(PyEnum):
     OVERDUE = "OVERDUE"
 
 
+class JobStatus(PyEnum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
 class Farmer(Base):
     __tablename__ = "farmers"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
     phoneNumber: Mapped[str] = mapped_column(String(32), nullable=False, unique=True)
     email: Mapped[str] = mapped_column(String(255), nullable=True, unique=True)
     gender: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -33,11 +40,22 @@ class Farmer(Base):
     )
 
 
+class FarmerDirectory(Base):
+    """Global farmer ids and the shard each farmer lives on. Only used on the first shard
+    when the database is sharded."""
+    __tablename__ = "farmer_directory"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    phoneNumber: Mapped[str] = mapped_column(String(32), nullable=False, unique=True)
+    email: Mapped[str] = mapped_column(String(255), nullable=True, unique=True)
+    shard: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
 class Farm(Base):
     __tablename__ = "farms"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    farmerId: Mapped[int] = mapped_column(Integer, ForeignKey("farmers.id"), nullable=False)
+    farmerId: Mapped[int] = mapped_column(Integer, ForeignKey("farmers.id"), nullable=False, index=True)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     sizeAcres: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
 
@@ -51,7 +69,7 @@ class SeasonPlan(Base):
     __tablename__ = "season_plans"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    farmId: Mapped[int] = mapped_column(Integer, ForeignKey("farms.id"), nullable=False)
+    farmId: Mapped[int] = mapped_column(Integer, ForeignKey("farms.id"), nullable=False, index=True)
     cropName: Mapped[str] = mapped_column(String(120), nullable=False)
     seasonName: Mapped[str] = mapped_column(String(120), nullable=False)
 
@@ -66,12 +84,16 @@ class SeasonPlan(Base):
 
 class PlannedActivity(Base):
     __tablename__ = "planned_activities"
+    __table_args__ = (
+        # date range scans for the activity calendar
+        Index("ix_planned_activities_targetDate_status", "targetDate", "status"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    seasonPlanId: Mapped[int] = mapped_column(Integer, ForeignKey("season_plans.id"), nullable=False)
+    seasonPlanId: Mapped[int] = mapped_column(Integer, ForeignKey("season_plans.id"), nullable=False, index=True)
     activityType: Mapped[str] = mapped_column(String(50), nullable=False)
     targetDate: Mapped[Date] = mapped_column(Date, nullable=False)
-    estimatedCostUgx: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    estimatedCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False)
     status: Mapped[StatusType] = mapped_column(Enum(StatusType), nullable=False)
 
     season_plan: Mapped[SeasonPlan] = relationship(back_populates="planned_activities")
@@ -84,10 +106,10 @@ class ActualActivity(Base):
     __tablename__ = "actual_activities"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    seasonPlanId: Mapped[int] = mapped_column(Integer, ForeignKey("season_plans.id"), nullable=False)
+    seasonPlanId: Mapped[int] = mapped_column(Integer, ForeignKey("season_plans.id"), nullable=False, index=True)
     activityType: Mapped[str] = mapped_column(String(50), nullable=False)
     actualDate: Mapped[Date] = mapped_column(Date, nullable=False)
-    actualCostUgx: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    actualCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     plannedActivityId: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("planned_activities.id"), nullable=True
@@ -95,3 +117,63 @@ class ActualActivity(Base):
 
     season_plan: Mapped[SeasonPlan] = relationship(back_populates="actual_activities")
     planned_activity: Mapped[PlannedActivity | None] = relationship(back_populates="actual_activities")
+
+
+class FarmerStats(Base):
+    """Per farmer totals, maintained by the write endpoints. See rollups.py."""
+    __tablename__ = "farmer_stats"
+
+    farmerId: Mapped[int] = mapped_column(Integer, ForeignKey("farmers.id"), primary_key=True, autoincrement=False)
+    farmCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    totalSizeAcres: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    seasonCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    activeSeasonCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    estimatedCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    actualCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    overdueCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class FarmStats(Base):
+    """Per farm totals, maintained by the write endpoints. See rollups.py."""
+    __tablename__ = "farm_stats"
+
+    farmId: Mapped[int] = mapped_column(Integer, ForeignKey("farms.id"), primary_key=True, autoincrement=False)
+    farmerId: Mapped[int] = mapped_column(Integer, ForeignKey("farmers.id"), nullable=False)
+    seasonCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    activeSeasonCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    estimatedCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    actualCostUgx: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    overdueCount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class OutboxEvent(Base):
+    """Change events appended by the write endpoints in the same transaction as the change.
+    Consumers read them in id order. See outbox.py."""
+    __tablename__ = "outbox_events"
+    # never reuse the ids of purged events, consumer cursors rely on them only growing
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    eventType: Mapped[str] = mapped_column(String(64), nullable=False)
+    aggregateId: Mapped[int] = mapped_column(Integer, nullable=False)
+    farmerId: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    createdAt: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=lambda: datetime.now(nairobi_tz))
+
+
+class ReportJob(Base):
+    """Report jobs run in the background by jobs.py. farmerId is the farmer who requested the
+    report, None for admin reports."""
+    __tablename__ = "report_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(64), nullable=False)
+    format: Mapped[str] = mapped_column(String(8), nullable=False)
+    params: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), nullable=False, index=True)
+    farmerId: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    rowCount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    createdAt: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=lambda: datetime.now(nairobi_tz))
+    startedAt: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finishedAt: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
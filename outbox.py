@@ -0,0 +1,130 @@
+"""Transactional outbox of change events for downstream consumers (analytics, SMS reminders).
+
+The farmers, farms and seasons write endpoints call record() or record_many() inside the
+same transaction as their own changes, so an event is stored if and only if its change is
+committed. Consumers read events in id order from a cursor, either with
+GET /admin/outbox?after={cursor} or from the command line:
+
+    python outbox.py consume --cursor-file outbox.cursor [--batch 1000] [--shard 0]
+    python outbox.py purge --through {id} [--shard 0]
+
+consume prints one JSON event per line and saves the last id in the cursor file after each
+batch, so a restarted consumer carries on where it stopped. purge deletes events every
+consumer has read. With sharding each shard has its own outbox and ids.
+
+Event ids follow commit order on SQLite, which has a single writer. On databases with
+concurrent writers a transaction can commit after one holding a higher id, so consumers
+there should re-read a short window behind their cursor.
+"""
+import argparse
+import json
+import sys
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from models import OutboxEvent
+
+
+def record(db: Session, event_type: str, aggregate_id: int, farmer_id: int, **payload):
+    """Append one change event to the outbox in the session's transaction."""
+    record_many(db, [(event_type, aggregate_id, farmer_id, payload)])
+
+
+def record_many(db: Session, events: list[tuple[str, int, int, dict]]):
+    """Append (event type, aggregate id, farmer id, payload) events with a single insert."""
+    if not events:
+        return
+    db.execute(
+        insert(OutboxEvent),
+        [
+            {
+                "eventType": event_type,
+                "aggregateId": aggregate_id,
+                "farmerId": farmer_id,
+                "payload": json.dumps(payload, default=str),
+            }
+            for event_type, aggregate_id, farmer_id, payload in events
+        ],
+    )
+
+
+def read_events(db: Session, after: int, limit: int) -> list[dict]:
+    """Return up to limit events with an id greater than after, in id order."""
+    rows = db.execute(
+        select(
+            OutboxEvent.id,
+            OutboxEvent.eventType,
+            OutboxEvent.aggregateId,
+            OutboxEvent.farmerId,
+            OutboxEvent.payload,
+            OutboxEvent.createdAt,
+        )
+        .where(OutboxEvent.id > after)
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+    )
+    return [
+        {
+            "id": row.id,
+            "eventType": row.eventType,
+            "aggregateId": row.aggregateId,
+            "farmerId": row.farmerId,
+            "payload": json.loads(row.payload),
+            "createdAt": row.createdAt.isoformat(),
+        }
+        for row in rows
+    ]
+
+
+def purge_events(db: Session, through: int) -> int:
+    """Delete the events up to and including id through. Returns the number deleted."""
+    return db.execute(delete(OutboxEvent).where(OutboxEvent.id <= through)).rowcount
+
+
+def _read_cursor(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_cursor(path: str, cursor: int):
+    with open(path, "w") as f:
+        f.write(str(cursor))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read or purge outbox events.")
+    parser.add_argument("command", choices=["consume", "purge"])
+    parser.add_argument("--shard", type=int, default=0)
+    parser.add_argument("--cursor-file", help="consume: file holding the last consumed id")
+    parser.add_argument("--batch", type=int, default=1000, help="consume: events per batch")
+    parser.add_argument("--through", type=int, help="purge: delete events up to this id")
+    args = parser.parse_args()
+
+    from database import SessionLocal, engines
+
+    # events go to stdout, keep the sql log out of it
+    engines[args.shard].echo = False
+    with SessionLocal(bind=engines[args.shard]) as db:
+        if args.command == "purge":
+            if args.through is None:
+                sys.exit("purge needs --through")
+            deleted = purge_events(db, args.through)
+            db.commit()
+            print(f"purged {deleted} events", file=sys.stderr)
+            sys.exit()
+
+        if not args.cursor_file:
+            sys.exit("consume needs --cursor-file")
+        cursor = _read_cursor(args.cursor_file)
+        while True:
+            events = read_events(db, cursor, args.batch)
+            db.rollback()
+            if not events:
+                break
+            for event in events:
+                sys.stdout.write(json.dumps(event) + "\n")
+            sys.stdout.flush()
+            cursor = events[-1]["id"]
+            _write_cursor(args.cursor_file, cursor)
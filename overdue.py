@@ -0,0 +1,65 @@
+"""Marking of planned activities that are past their target date as OVERDUE.
+
+Statuses are stored, so the farmer and farm rollups can count overdue activities, and are
+brought up to date when a farmer's seasons are read: season details and summaries mark the
+season being read, and the snapshot cache marks all of a farmer's seasons before loading
+their snapshot.
+"""
+from datetime import date, datetime
+from functools import partial
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm import Session
+from dependencies import nairobi_tz
+from models import Farm, SeasonPlan, PlannedActivity, StatusType
+from write_queue import run_write
+import rollups
+import outbox
+
+
+def _stale(today: date):
+    return (PlannedActivity.status == StatusType.UPCOMING) & (PlannedActivity.targetDate < today)
+
+
+def _stale_seasons(farmer_id: int, season_id: int | None, today: date):
+    """(season id, farm id) of the farmer's seasons with stale activities, or only the given one."""
+    query = (
+        select(SeasonPlan.id, SeasonPlan.farmId)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(Farm.farmerId == farmer_id, exists().where(PlannedActivity.seasonPlanId == SeasonPlan.id, _stale(today)))
+    )
+    if season_id is not None:
+        query = query.where(SeasonPlan.id == season_id)
+    return query
+
+
+def _mark(session: Session, farmer_id: int, season_id: int | None, today: date) -> bool:
+    marked = False
+    for season_id, farm_id in session.execute(_stale_seasons(farmer_id, season_id, today)).all():
+        # concurrent readers race to mark the same activities, each one only counts the rows
+        # its own update flipped
+        overdue_ids = session.scalars(
+            update(PlannedActivity)
+            .where(PlannedActivity.seasonPlanId == season_id, _stale(today))
+            .values(status=StatusType.OVERDUE)
+            .returning(PlannedActivity.id)
+        ).all()
+        if not overdue_ids:
+            continue
+        rollups.season_changed(session, farm_id, farmer_id, overdue=len(overdue_ids))
+        outbox.record_many(session, [
+            ("planned_activity.overdue", activity_id, farmer_id, {"seasonId": season_id})
+            for activity_id in overdue_ids
+        ])
+        marked = True
+    return marked
+
+
+def mark_overdue(db: Session, farmer_id: int, season_id: int | None = None) -> bool:
+    """Mark the farmer's UPCOMING activities with a target date before today as OVERDUE, or
+    only those of one season, and update the rollups and outbox. The marking is a write like
+    any other and goes through run_write. Returns whether any activity was marked."""
+    today = datetime.now(nairobi_tz).date()
+    # most reads find nothing to mark and stay reads
+    if db.execute(_stale_seasons(farmer_id, season_id, today).limit(1)).first() is None:
+        return False
+    return run_write(db, partial(_mark, farmer_id=farmer_id, season_id=season_id, today=today))
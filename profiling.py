@@ -0,0 +1,220 @@
+"""On demand request profiling.
+
+When PROFILING_ENABLED is set, a request is profiled if it carries an `x-profile: 1` header
+together with a valid `admin-key` header, or at random for a PROFILE_SAMPLE_RATE fraction of
+requests. The middleware is not installed at all otherwise.
+
+A profiled request runs with a sampling profiler that records the stacks of the event loop
+and of the threadpool workers every PROFILE_INTERVAL_MS. Samples are written to PROFILE_DIR
+as collapsed stacks (one `frame;frame;frame count` line per distinct stack, the input format
+of flamegraph.pl and speedscope) next to a JSON file with the route, status and timing. The
+profile id is returned in the X-Profile-Id response header, and GET /admin/profiles lists
+recent profiles.
+
+Only one request is profiled at a time. The event loop is sampled while its stack is inside
+the profiled request, and a threadpool worker while it runs a call made by the profiled
+request: the request's context holds a marker, and anyio runs each threadpool call in a
+copy of the caller's context. Background threads and other requests stay out of the
+profile; concurrentRequests in the metadata tells how busy the process was.
+"""
+import json
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dependencies import nairobi_tz
+from utils import settings
+
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+# marker of the profiled request, copied into the context of its threadpool calls
+_profiled_request: ContextVar[object | None] = ContextVar("profiled_request", default=None)
+
+try:
+    # the loop of an anyio worker thread, its `context` local is the context of the call it runs
+    from anyio._backends._asyncio import WorkerThread
+    WORKER_RUN_CODE = WorkerThread.run.__code__
+except (ImportError, AttributeError):
+    WORKER_RUN_CODE = None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if "site-packages" in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(PROJECT_ROOT):
+        filename = filename[len(PROJECT_ROOT):]
+    elif filename.startswith(STDLIB):
+        filename = filename[len(STDLIB):]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stacks of the profiled request's threads on a background thread and counts
+    collapsed stacks."""
+
+    def __init__(self, interval: float, request_code, marker: object, loop_thread_id: int):
+        self.interval = interval
+        # code object of the coroutine wrapping the profiled request on the event loop
+        self.request_code = request_code
+        self.marker = marker
+        self.loop_thread_id = loop_thread_id
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _runs_request(self, thread_id: int, frame) -> bool:
+        """Whether the thread is working for the profiled request."""
+        while frame is not None:
+            code = frame.f_code
+            if thread_id == self.loop_thread_id:
+                if code is self.request_code:
+                    return True
+            elif code is WORKER_RUN_CODE:
+                context = frame.f_locals.get("context")
+                return context is not None and context.get(_profiled_request) is self.marker
+            frame = frame.f_back
+        return False
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or not self._runs_request(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class ProfilingMiddleware:
+    """Profile requests on demand and store the profiles in PROFILE_DIR."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.profile_dir = settings.PROFILE_DIR
+        self.interval = settings.PROFILE_INTERVAL_MS / 1000
+        self.in_flight = 0
+        self.profiling = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trigger = self._trigger(scope)
+        self.in_flight += 1
+        try:
+            # one profile at a time, the others run as usual
+            if trigger is None or self.profiling:
+                return await self.app(scope, receive, send)
+            self.profiling = True
+            try:
+                await self._profile_request(scope, receive, send, trigger)
+            finally:
+                self.profiling = False
+        finally:
+            self.in_flight -= 1
+
+    def _trigger(self, scope: Scope) -> str | None:
+        """Why this request should be profiled, None if it should not."""
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1" and headers.get(b"admin-key") == settings.ADMIN_KEY.encode():
+            return "header"
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def _profile_request(self, scope: Scope, receive: Receive, send: Send, trigger: str):
+        started_at = datetime.now(nairobi_tz)
+        profile_id = f"{started_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        status_code = None
+        max_concurrent = self.in_flight
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status_code, max_concurrent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            max_concurrent = max(max_concurrent, self.in_flight)
+            await send(message)
+
+        marker = object()
+        marker_token = _profiled_request.set(marker)
+        sampler = StackSampler(self.interval, self._profile_request.__code__, marker, threading.get_ident())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            _profiled_request.reset(marker_token)
+            duration = time.perf_counter() - start
+            metadata = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode(),
+                "statusCode": status_code,
+                "trigger": trigger,
+                "startedAt": started_at.isoformat(),
+                "durationMs": round(duration * 1000, 2),
+                "intervalMs": settings.PROFILE_INTERVAL_MS,
+                "samples": sampler.samples,
+                "concurrentRequests": max_concurrent,
+            }
+            self._save(profile_id, sampler.stacks, metadata)
+
+    def _save(self, profile_id: str, stacks: Counter, metadata: dict):
+        with open(os.path.join(self.profile_dir, f"{profile_id}.collapsed"), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.profile_dir, f"{profile_id}.json"), "w") as f:
+            json.dump(metadata, f)
+        prune_profiles(self.profile_dir, settings.PROFILE_MAX_FILES)
+
+
+def prune_profiles(profile_dir: str, keep: int):
+    """Delete all but the newest keep profiles."""
+    for profile_id in list_profile_ids(profile_dir)[keep:]:
+        for extension in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(profile_dir, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profile_ids(profile_dir: str) -> list[str]:
+    """Profile ids in profile_dir, newest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    names = [name[: -len(".json")] for name in os.listdir(profile_dir) if name.endswith(".json")]
+    return sorted(names, reverse=True)
+
+
+def read_profile_metadata(profile_dir: str, profile_id: str) -> dict | None:
+    try:
+        with open(os.path.join(profile_dir, f"{profile_id}.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,162 @@
+"""Per farmer and per farm totals, kept up to date by the write endpoints.
+
+The farms and seasons write endpoints call the functions below inside the same transaction
+as their own changes, so the farmer_stats and farm_stats rows always match the data they
+summarise. A season counts as active while it has planned activities that are not COMPLETED,
+and overdue counts follow the stored activity statuses.
+
+Concurrent writes must not lose each other's changes, so nothing is derived from state read
+before the transaction holds the write lock. Counters that a change moves by a known amount
+(costs, new farms and seasons, activities whose status a statement actually flipped) are
+added in a single UPDATE. Totals that depend on the rest of the data (active seasons, acres)
+are recomputed from the base tables once the rollup rows are locked.
+
+If the tables ever drift, rebuild them from scratch with:
+
+    python rollups.py rebuild
+"""
+import sys
+from sqlalchemy import exists, func, insert, select, text, update
+from sqlalchemy.orm import Session
+from models import Farm, FarmerStats, FarmStats, SeasonPlan, PlannedActivity, StatusType
+
+
+def _bump(db: Session, model, key_column, key: int, create: dict, **deltas):
+    """Add deltas to the counters of one rollup row, creating the row if it is missing."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    result = db.execute(
+        update(model)
+        .where(key_column == key)
+        .values({name: getattr(model, name) + delta for name, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        db.execute(insert(model).values(**create, **deltas))
+
+
+def _bump_farm(db: Session, farm_id: int, farmer_id: int, **deltas):
+    _bump(db, FarmStats, FarmStats.farmId, farm_id, {"farmId": farm_id, "farmerId": farmer_id}, **deltas)
+
+
+def _bump_farmer(db: Session, farmer_id: int, **deltas):
+    _bump(db, FarmerStats, FarmerStats.farmerId, farmer_id, {"farmerId": farmer_id}, **deltas)
+
+
+def farmer_created(db: Session, farmer_id: int):
+    db.execute(insert(FarmerStats).values(farmerId=farmer_id))
+
+
+def farm_created(db: Session, farm_id: int, farmer_id: int, size_acres: float):
+    db.execute(insert(FarmStats).values(farmId=farm_id, farmerId=farmer_id))
+    _bump_farmer(db, farmer_id, farmCount=1, totalSizeAcres=size_acres)
+
+
+def _lock(db: Session, farm_id: int | None, farmer_id: int):
+    """Lock the rollup rows before reading the base tables they summarise, so a concurrent
+    change is either seen or waits for this transaction. SQLite has no row locks, but the
+    change this transaction made already holds its database write lock."""
+    if farm_id is not None:
+        db.execute(select(FarmStats.farmId).where(FarmStats.farmId == farm_id).with_for_update())
+    db.execute(select(FarmerStats.farmerId).where(FarmerStats.farmerId == farmer_id).with_for_update())
+
+
+def farm_resized(db: Session, farmer_id: int):
+    """Recompute the farmer's acreage after a farm's size changed; the change must be flushed."""
+    _lock(db, None, farmer_id)
+    total = select(func.coalesce(func.sum(Farm.sizeAcres), 0)).where(Farm.farmerId == farmer_id).scalar_subquery()
+    db.execute(update(FarmerStats).where(FarmerStats.farmerId == farmer_id).values(totalSizeAcres=total))
+
+
+def season_created(db: Session, farm_id: int, farmer_id: int):
+    _bump_farm(db, farm_id, farmer_id, seasonCount=1)
+    _bump_farmer(db, farmer_id, seasonCount=1)
+
+
+def _active_seasons(*where):
+    pending = exists().where(PlannedActivity.seasonPlanId == SeasonPlan.id, PlannedActivity.status != StatusType.COMPLETED)
+    return select(func.count(SeasonPlan.id)).join(Farm, SeasonPlan.farmId == Farm.id).where(pending, *where).scalar_subquery()
+
+
+def season_changed(
+    db: Session,
+    farm_id: int,
+    farmer_id: int,
+    overdue: int = 0,
+    estimated_cost: int = 0,
+    actual_cost: int = 0,
+):
+    """Apply a change to a season's activities; pending changes must be flushed before
+    calling this. overdue is the change in the number of OVERDUE activities, counted from the
+    rows the change inserted or updated, and the costs are those of the added activities.
+    Active seasons are recomputed, as whether a season was active depends on rows other
+    transactions may be changing."""
+    deltas = {"overdueCount": overdue, "estimatedCostUgx": estimated_cost, "actualCostUgx": actual_cost}
+    _bump_farm(db, farm_id, farmer_id, **deltas)
+    _bump_farmer(db, farmer_id, **deltas)
+
+    _lock(db, farm_id, farmer_id)
+    db.execute(
+        update(FarmStats).where(FarmStats.farmId == farm_id)
+        .values(activeSeasonCount=_active_seasons(SeasonPlan.farmId == farm_id))
+    )
+    db.execute(
+        update(FarmerStats).where(FarmerStats.farmerId == farmer_id)
+        .values(activeSeasonCount=_active_seasons(Farm.farmerId == farmer_id))
+    )
+
+
+REBUILD_FARM_STATS = """
+INSERT INTO farm_stats ("farmId", "farmerId", "seasonCount", "activeSeasonCount", "estimatedCostUgx", "actualCostUgx", "overdueCount")
+SELECT
+    f.id,
+    f."farmerId",
+    (SELECT count(*) FROM season_plans s WHERE s."farmId" = f.id),
+    (SELECT count(*) FROM season_plans s WHERE s."farmId" = f.id AND EXISTS (
+        SELECT 1 FROM planned_activities p WHERE p."seasonPlanId" = s.id AND p.status != 'COMPLETED')),
+    (SELECT coalesce(sum(p."estimatedCostUgx"), 0) FROM planned_activities p
+        JOIN season_plans s ON p."seasonPlanId" = s.id WHERE s."farmId" = f.id),
+    (SELECT coalesce(sum(a."actualCostUgx"), 0) FROM actual_activities a
+        JOIN season_plans s ON a."seasonPlanId" = s.id WHERE s."farmId" = f.id),
+    (SELECT count(*) FROM planned_activities p
+        JOIN season_plans s ON p."seasonPlanId" = s.id WHERE s."farmId" = f.id AND p.status = 'OVERDUE')
+FROM farms f
+"""
+
+REBUILD_FARMER_STATS = """
+INSERT INTO farmer_stats ("farmerId", "farmCount", "totalSizeAcres", "seasonCount", "activeSeasonCount", "estimatedCostUgx", "actualCostUgx", "overdueCount")
+SELECT
+    fr.id,
+    count(f.id),
+    coalesce(sum(f."sizeAcres"), 0),
+    coalesce(sum(fs."seasonCount"), 0),
+    coalesce(sum(fs."activeSeasonCount"), 0),
+    coalesce(sum(fs."estimatedCostUgx"), 0),
+    coalesce(sum(fs."actualCostUgx"), 0),
+    coalesce(sum(fs."overdueCount"), 0)
+FROM farmers fr
+LEFT JOIN farms f ON f."farmerId" = fr.id
+LEFT JOIN farm_stats fs ON fs."farmId" = f.id
+GROUP BY fr.id
+"""
+
+
+def rebuild_rollups(db: Session):
+    """Recompute every rollup row from the base tables."""
+    db.execute(text("DELETE FROM farmer_stats"))
+    db.execute(text("DELETE FROM farm_stats"))
+    db.execute(text(REBUILD_FARM_STATS))
+    db.execute(text(REBUILD_FARMER_STATS))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python rollups.py rebuild")
+
+    from database import SessionLocal, engines
+
+    for shard_engine in engines:
+        with SessionLocal(bind=shard_engine) as db:
+            rebuild_rollups(db)
+            db.commit()
+        print(f"rebuilt rollups on {shard_engine.url}")
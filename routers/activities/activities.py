@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from routers.activities.schemas import CalendarOut
+from database import get_db, bind_to_farmer
+from models import Farm, SeasonPlan, PlannedActivity, StatusType
+from datetime import datetime, date, timedelta
+from dependencies import verify_token, nairobi_tz
+from utils import settings
+
+
+router = APIRouter(prefix="/activities", tags=["activities"])
+
+# longest date range a calendar request can cover
+MAX_CALENDAR_DAYS = 366
+
+
+# Get planned activities due in a date range across all farms and seasons of a farmer
+@router.get("/calendar", response_model=CalendarOut)
+def get_activity_calendar(
+    date_from: date | None = Query(default=None, alias="from"),
+    date_to: date | None = Query(default=None, alias="to"),
+    status: StatusType | None = None,
+    farmerId: int | None = None,
+    page: int = Query(default=1, ge=1),
+    pageSize: int = Query(default=100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    farmer_id: int = Depends(verify_token),
+    admin_key: str | None = Header(default=None),
+):
+    """Get planned activities due between from and to (default: the next 14 days) across all farms and seasons of the authenticated farmer, grouped by date. Admins (admin-key header) can pass farmerId to view any farmer's calendar. Status is evaluated as of today: past activities that are not COMPLETED are OVERDUE."""
+    if not farmer_id:
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
+
+    # farmers see their own calendar, admins can look at any farmer
+    owner_id = farmer_id
+    if farmerId is not None and farmerId != farmer_id:
+        if admin_key != settings.ADMIN_KEY:
+            raise HTTPException(status_code=403, detail="Forbidden: You can only access your own activities")
+        owner_id = farmerId
+        bind_to_farmer(db, owner_id)
+
+    today = datetime.now(nairobi_tz).date()
+    date_from = date_from or today
+    date_to = date_to or date_from + timedelta(days=14)
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days > MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range can not be longer than {MAX_CALENDAR_DAYS} days")
+
+    # range scan on the (targetDate, status) index, joined up to the owning farmer
+    query = (
+        db.query(
+            PlannedActivity.id,
+            PlannedActivity.activityType,
+            PlannedActivity.targetDate,
+            PlannedActivity.estimatedCostUgx,
+            PlannedActivity.status,
+            SeasonPlan.id,
+            SeasonPlan.cropName,
+            SeasonPlan.seasonName,
+            Farm.id,
+            Farm.name,
+        )
+        .join(SeasonPlan, PlannedActivity.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .filter(
+            Farm.farmerId == owner_id,
+            PlannedActivity.targetDate >= date_from,
+            PlannedActivity.targetDate <= date_to,
+        )
+    )
+
+    # stored statuses are only refreshed when a season is read, so filter on the effective status
+    if status == StatusType.COMPLETED:
+        query = query.filter(PlannedActivity.status == StatusType.COMPLETED)
+    elif status == StatusType.OVERDUE:
+        query = query.filter(and_(PlannedActivity.status != StatusType.COMPLETED, PlannedActivity.targetDate < today))
+    elif status == StatusType.UPCOMING:
+        query = query.filter(and_(PlannedActivity.status != StatusType.COMPLETED, PlannedActivity.targetDate >= today))
+
+    # fetch one extra row to know if there is a next page
+    rows = (
+        query.order_by(PlannedActivity.targetDate, PlannedActivity.id)
+        .offset((page - 1) * pageSize)
+        .limit(pageSize + 1)
+        .all()
+    )
+    has_more = len(rows) > pageSize
+    rows = rows[:pageSize]
+
+    # group by date, rows are already in date order
+    days = []
+    for activity_id, activity_type, target_date, cost, activity_status, season_id, crop_name, season_name, farm_id, farm_name in rows:
+        if activity_status != StatusType.COMPLETED and target_date < today:
+            activity_status = StatusType.OVERDUE
+        if not days or days[-1]["date"] != target_date:
+            days.append({"date": target_date, "activities": []})
+        days[-1]["activities"].append({
+            "id": activity_id,
+            "activityType": activity_type,
+            "status": activity_status.value,
+            "estimatedCostUgx": cost,
+            "seasonId": season_id,
+            "cropName": crop_name,
+            "seasonName": season_name,
+            "farmId": farm_id,
+            "farmName": farm_name,
+        })
+
+    return {
+        "farmerId": owner_id,
+        "dateFrom": date_from,
+        "dateTo": date_to,
+        "page": page,
+        "pageSize": pageSize,
+        "hasMore": has_more,
+        "days": days,
+    }
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import List
+
+
+class CalendarActivityOut(BaseModel):
+	id: int
+	activityType: str
+	status: str
+	estimatedCostUgx: int
+	seasonId: int
+	cropName: str
+	seasonName: str
+	farmId: int
+	farmName: str
+
+
+class CalendarDayOut(BaseModel):
+	date: date
+	activities: List[CalendarActivityOut]
+
+
+class CalendarOut(BaseModel):
+	farmerId: int
+	dateFrom: date
+	dateTo: date
+	page: int
+	pageSize: int
+	hasMore: bool
+	days: List[CalendarDayOut]
@@ -0,0 +1,92 @@
+import os
+import re
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import FileResponse
+from database import SessionLocal, engines
+from outbox import read_events
+from profiling import list_profile_ids, read_profile_metadata
+from snapshot_cache import snapshot_cache
+from utils import settings
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9T]+-[0-9a-f]+$")
+
+
+# Get snapshot cache stats (admin only)
+@router.get("/snapshot-cache")
+def get_snapshot_cache_stats(admin_key: str = Header()):
+    """Hit rate, memory usage and eviction counts of the per farmer snapshot cache. Admin only."""
+
+    # verify admin key
+    if admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+    return snapshot_cache.stats()
+
+
+# List recent request profiles (admin only)
+@router.get("/profiles")
+def list_profiles(
+    admin_key: str = Header(),
+    path: str | None = Query(default=None, description="only profiles of requests to this path"),
+    limit: int = Query(default=20, ge=1, le=200),
+):
+    """List recent request profiles, newest first, with their route and timing metadata. Admin only."""
+
+    # verify admin key
+    if admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+    profiles = []
+    for profile_id in list_profile_ids(settings.PROFILE_DIR):
+        metadata = read_profile_metadata(settings.PROFILE_DIR, profile_id)
+        if metadata is None or (path is not None and metadata["path"] != path):
+            continue
+        profiles.append(metadata)
+        if len(profiles) == limit:
+            break
+    return profiles
+
+
+# Download a request profile (admin only)
+@router.get("/profiles/{profileId}")
+def get_profile(profileId: str, admin_key: str = Header()):
+    """Download a request profile as collapsed stacks, for flamegraph.pl or speedscope. Admin only."""
+
+    # verify admin key
+    if admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+    # profile ids are generated file names, reject anything else
+    file_path = os.path.join(settings.PROFILE_DIR, f"{profileId}.collapsed")
+    if not PROFILE_ID_PATTERN.match(profileId) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return FileResponse(file_path, media_type="text/plain", filename=f"{profileId}.collapsed")
+
+
+# Read outbox events from a cursor (admin only)
+@router.get("/outbox")
+def read_outbox(
+    admin_key: str = Header(),
+    after: int = Query(default=0, ge=0, description="id of the last event already consumed"),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    shard: int = Query(default=0, ge=0),
+):
+    """Read change events in order after a cursor. Pass the returned nextCursor as after to read the next batch. Admin only."""
+
+    # verify admin key
+    if admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+    if shard >= len(engines):
+        raise HTTPException(status_code=404, detail="Shard not found")
+
+    with SessionLocal(bind=engines[shard]) as db:
+        events = read_events(db, after, limit)
+    return {
+        "events": events,
+        "nextCursor": events[-1]["id"] if events else after,
+        "hasMore": len(events) == limit,
+    }
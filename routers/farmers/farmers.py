@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
+from sqlalchemy import func, inspect, or_, text
 from sqlalchemy.orm import Session
-from routers.farmers.schemas import FarmerCreate, FarmerOut, FarmerLogin
-from database import get_db
-from models import Farmer
+from routers.farmers.schemas import FarmerCreate, FarmerOut, FarmerLogin, FarmerSearchOut, FarmerStatsOut
+from database import get_db, SHARDING_ENABLED, bind_to_farmer, register_farmer, scatter_gather
+from models import Farmer, FarmerDirectory, FarmerStats
 import bcrypt
 from utils import settings
 import jwt
 from datetime import datetime, timedelta
-from dependencies import nairobi_tz
+from dependencies import nairobi_tz, verify_token
+import re
+from write_queue import run_write
+import rollups
+import outbox
 
 
 router = APIRouter(prefix="/farmers", tags=["farmers"])
@@ -22,7 +27,76 @@ def read_farmers(db: Session = Depends(get_db), admin_key: str = Header()):
     if admin_key != settings.ADMIN_KEY:
         raise HTTPException(status_code=401, detail="Invalid admin key")
     
-    return db.query(Farmer).all()
+    return scatter_gather(db, lambda session: session.query(Farmer).all())
+
+
+# engines that have the sqlite full text search index for farmers
+_fts_engines: dict = {}
+
+
+def _has_fts_index(db: Session) -> bool:
+    bind = db.get_bind()
+    if bind not in _fts_engines:
+        _fts_engines[bind] = bind.dialect.name == "sqlite" and inspect(bind).has_table("farmers_fts")
+    return _fts_engines[bind]
+
+
+def _search_farmers(db: Session, terms: list[str], limit: int, offset: int) -> list[tuple[float, Farmer]]:
+    """Return (rank, farmer) pairs for farmers matching every term as a prefix, best match first."""
+    if _has_fts_index(db):
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = db.execute(
+            text("SELECT rowid, rank FROM farmers_fts WHERE farmers_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"),
+            {"match": match, "limit": limit, "offset": offset},
+        ).all()
+        farmers = {farmer.id: farmer for farmer in db.query(Farmer).filter(Farmer.id.in_([row[0] for row in rows]))}
+        return [(rank, farmers[farmer_id]) for farmer_id, rank in rows if farmer_id in farmers]
+
+    # generic fallback: every term must start the name, phone number or email. lowercase prefix
+    # patterns, so postgres can use the text_pattern_ops indexes on lower(name) and lower(email).
+    # words inside a name are only matched by the full text index
+    query = db.query(Farmer)
+    for term in terms:
+        # terms are letters, digits and "_", which LIKE would take for any character
+        pattern = term.lower().replace("_", "/_") + "%"
+        query = query.filter(or_(
+            func.lower(Farmer.name).like(pattern, escape="/"),
+            Farmer.phoneNumber.like(pattern, escape="/"),
+            func.lower(Farmer.email).like(pattern, escape="/"),
+        ))
+    farmers = query.order_by(Farmer.name, Farmer.id).offset(offset).limit(limit).all()
+    return [(0.0, farmer) for farmer in farmers]
+
+
+# Search farmers (admin only)
+@router.get("/search", response_model=FarmerSearchOut)
+def search_farmers(
+    q: str = Query(min_length=1),
+    page: int = Query(default=1, ge=1),
+    pageSize: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    admin_key: str = Header(),
+):
+    """Search farmers by partial name, phone number or email. Admin only. Results are ranked by relevance and paginated."""
+
+    # verify admin key
+    if admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+    # only letters and digits are searched, anything else separates terms
+    terms = re.findall(r"\w+", q)
+    offset = (page - 1) * pageSize
+    if not terms:
+        return {"query": q, "page": page, "pageSize": pageSize, "results": []}
+
+    if SHARDING_ENABLED:
+        # every shard returns its best matches up to this page, which are then merged by rank
+        matches = scatter_gather(db, lambda session: _search_farmers(session, terms, offset + pageSize, 0))
+        matches = sorted(matches, key=lambda match: match[0])[offset:offset + pageSize]
+    else:
+        matches = _search_farmers(db, terms, pageSize, offset)
+
+    return {"query": q, "page": page, "pageSize": pageSize, "results": [farmer for _, farmer in matches]}
 
 
 # Create a new farmer (admin only)
@@ -34,16 +108,19 @@ def create_farmer(payload: FarmerCreate, db: Session = Depends(get_db), admin_ke
     if admin_key != settings.ADMIN_KEY:
         raise HTTPException(status_code=401, detail="Invalid admin key")
     
+    # with sharding, phone numbers and emails are unique across shards via the farmer directory
+    lookup = FarmerDirectory if SHARDING_ENABLED else Farmer
+
     # check if phoneNumber already exists
-    existing_farmer = db.query(Farmer).filter(
-        (Farmer.phoneNumber == payload.phoneNumber)
+    existing_farmer = db.query(lookup).filter(
+        (lookup.phoneNumber == payload.phoneNumber)
     ).first()
     if existing_farmer:
         raise HTTPException(status_code=400, detail="Farmer with given phone number already exists")
     
     #  check if email already exists
-    existing_email = db.query(Farmer).filter(
-        (Farmer.email == payload.email)
+    existing_email = db.query(lookup).filter(
+        (lookup.email == payload.email)
     ).first()
     if existing_email:
         raise HTTPException(status_code=400, detail="Farmer with given email already exists")
@@ -52,19 +129,33 @@ def create_farmer(payload: FarmerCreate, db: Session = Depends(get_db), admin_ke
     hashed = bcrypt.hashpw(payload.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
     # create farmer
-    farmer = Farmer(
-        name=payload.name,
-        phoneNumber=payload.phoneNumber,
-        email=payload.email,
-        hashedPassword=hashed,
-        gender=payload.gender
-    )
+    def create(session: Session, farmer_id: int | None = None):
+        farmer = Farmer(
+            id=farmer_id,
+            name=payload.name,
+            phoneNumber=payload.phoneNumber,
+            email=payload.email,
+            hashedPassword=hashed,
+            gender=payload.gender
+        )
+        session.add(farmer)
+        session.flush()
+        if farmer_id is None:
+            # keep the directory complete so sharding can be turned on later
+            session.add(FarmerDirectory(id=farmer.id, phoneNumber=farmer.phoneNumber, email=farmer.email, shard=0))
+        rollups.farmer_created(session, farmer.id)
+        outbox.record(
+            session, "farmer.created", farmer.id, farmer.id,
+            name=farmer.name, phoneNumber=farmer.phoneNumber, email=farmer.email, gender=farmer.gender,
+        )
+        return farmer
+
+    # with sharding, the directory hands out a global farmer id and the farmer is written to its shard
+    if SHARDING_ENABLED:
+        return register_farmer(db, payload.phoneNumber, payload.email, create)
 
     # save to db
-    db.add(farmer)
-    db.commit()
-    db.refresh(farmer)
-    return farmer
+    return run_write(db, create)
 
 
 # Farmer login
@@ -72,6 +163,13 @@ def create_farmer(payload: FarmerCreate, db: Session = Depends(get_db), admin_ke
 def login_farmer(payload: FarmerLogin, db: Session = Depends(get_db)):
     """Login farmer and return JWT access token."""
 
+    # with sharding, find the farmer's shard in the directory first
+    if SHARDING_ENABLED:
+        entry = db.query(FarmerDirectory).filter(FarmerDirectory.phoneNumber == payload.phoneNumber).first()
+        if not entry:
+            raise HTTPException(status_code=401, detail="Invalid phone number or password")
+        bind_to_farmer(db, entry.id)
+
     # find farmer by phone number
     farmer = db.query(Farmer).filter(Farmer.phoneNumber == payload.phoneNumber).first()
     if not farmer:
@@ -86,4 +184,23 @@ def login_farmer(payload: FarmerLogin, db: Session = Depends(get_db)):
     to_encode = {"sub": str(farmer.id), "user": user, "exp": expire.timestamp()}
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     
-    return {"message": "Login successful", "farmerId": farmer.id, "jwt_access_token": encoded_jwt}
\ No newline at end of file
+    return {"message": "Login successful", "farmerId": farmer.id, "jwt_access_token": encoded_jwt}
+
+
+# Get farmer stats
+@router.get("/{farmerId}/stats", response_model=FarmerStatsOut)
+def get_farmer_stats(farmerId: int, db: Session = Depends(get_db), farmer_id: int = Depends(verify_token), admin_key: str | None = Header(default=None)):
+    """Get totals for a farmer across all their farms and seasons. Farmers can only access their own stats, admins (admin-key header) can access any farmer."""
+    if not farmer_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized: Invalid Authorization token")
+
+    # farmers can only see their own stats, admins can see any farmer
+    if farmerId != farmer_id:
+        if admin_key != settings.ADMIN_KEY:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only access your own stats")
+        bind_to_farmer(db, farmerId)
+
+    stats = db.get(FarmerStats, farmerId)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Farmer not found")
+    return stats
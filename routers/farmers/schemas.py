@@ -20,4 +20,24 @@ class FarmerOut(BaseModel):
 
 class FarmerLogin(BaseModel):
     phoneNumber: str
-    password: str
\ No newline at end of file
+    password: str
+
+class FarmerSearchOut(BaseModel):
+	query: str
+	page: int
+	pageSize: int
+	results: list[FarmerOut]
+
+
+class FarmerStatsOut(BaseModel):
+	farmerId: int
+	farmCount: int
+	totalSizeAcres: float
+	seasonCount: int
+	activeSeasonCount: int
+	estimatedCostUgx: int
+	actualCostUgx: int
+	overdueCount: int
+
+	class Config:
+		from_attributes = True
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, status
 from sqlalchemy.orm import Session
-from routers.farms.schemas import FarmCreate, FarmOut, UpdateFarm
-from database import get_db
-from models import Farm
+from routers.farms.schemas import FarmCreate, FarmOut, UpdateFarm, FarmStatsOut
+from database import get_db, bind_to_farmer, scatter_gather
+from models import Farm, FarmStats
 from dependencies import verify_token
 from utils import settings
+from write_queue import run_write
+import rollups
+import outbox
+from snapshot_cache import snapshot_cache
 
 
 router = APIRouter(prefix="/farms", tags=["farms"])
@@ -19,9 +23,10 @@ def read_farms(farmerId: int | None = None, db: Session = Depends(get_db), farme
         if admin_key != settings.ADMIN_KEY:
             raise HTTPException(status_code=401, detail="Invalid admin key")
         if farmerId != None:
+            bind_to_farmer(db, farmerId)
             return db.query(Farm).filter(Farm.farmerId == farmerId).all()
         else:
-            return db.query(Farm).all()
+            return scatter_gather(db, lambda session: session.query(Farm).all())
         
     # if no admin_key, verify farmer_id from token and return farms for that farmer only
     else:
@@ -30,7 +35,12 @@ def read_farms(farmerId: int | None = None, db: Session = Depends(get_db), farme
         # verify farmerId matches authenticated farmer_id
         if farmerId != farmer_id:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only access your own farms")
-        
+
+        # serve from the farmer's cached snapshot when available
+        snapshot = snapshot_cache.get(db, farmer_id)
+        if snapshot is not None:
+            return list(snapshot.farms.values())
+
         return db.query(Farm).filter(Farm.farmerId == farmerId).all()    
 
 
@@ -46,16 +56,21 @@ def creating_a_farm(payload: FarmCreate, db: Session = Depends(get_db), farmer_i
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only create farms for your own account")
     
     # create farm
-    farm = Farm(
-        farmerId=payload.farmerId,
-        name=payload.name,
-        sizeAcres=payload.sizeAcres,
-    )
+    def create(session: Session):
+        farm = Farm(
+            farmerId=payload.farmerId,
+            name=payload.name,
+            sizeAcres=payload.sizeAcres,
+        )
+        session.add(farm)
+        session.flush()
+        rollups.farm_created(session, farm.id, farm.farmerId, payload.sizeAcres)
+        outbox.record(session, "farm.created", farm.id, farm.farmerId, name=farm.name, sizeAcres=payload.sizeAcres)
+        return farm
 
     # save to db
-    db.add(farm)
-    db.commit()
-    db.refresh(farm)
+    farm = run_write(db, create)
+    snapshot_cache.invalidate(farmer_id)
     return farm
 
 # update farm
@@ -75,13 +90,42 @@ def update_farm(farmId: int, payload: UpdateFarm, db: Session = Depends(get_db),
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only update your own farms")
     
     # update fields if provided
-    if payload.name is not None:
-        farm.name = payload.name
-    if payload.sizeAcres is not None:
-        farm.sizeAcres = payload.sizeAcres
-    
+    def update(session: Session):
+        farm = session.get(Farm, farmId)
+        if payload.name is not None:
+            farm.name = payload.name
+        if payload.sizeAcres is not None:
+            farm.sizeAcres = payload.sizeAcres
+        session.flush()
+        if payload.sizeAcres is not None:
+            rollups.farm_resized(session, farm.farmerId)
+        outbox.record(session, "farm.updated", farm.id, farm.farmerId, **payload.model_dump(exclude_none=True))
+        return farm
+
     # save to db
-    db.add(farm)
-    db.commit()
-    db.refresh(farm)
-    return farm
\ No newline at end of file
+    farm = run_write(db, update)
+    snapshot_cache.invalidate(farmer_id)
+    return farm
+
+
+# get farm stats
+@router.get("/{farmId}/stats", response_model=FarmStatsOut)
+def get_farm_stats(farmId: int, farmerId: int | None = None, db: Session = Depends(get_db), farmer_id: int = Depends(verify_token), admin_key: str | None = Header(default=None)):
+    """Get totals for a farm across all its seasons. Only the owner farmer or an admin (admin-key header) can access them. Admins pass the owner's farmerId to reach farms of other farmers, farm ids are only unique within a shard."""
+    if not farmer_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized: Invalid Authorization token")
+
+    # admins can see any farm, on the shard of its owner
+    if farmerId is not None and farmerId != farmer_id:
+        if admin_key != settings.ADMIN_KEY:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only access your own farms")
+        bind_to_farmer(db, farmerId)
+
+    stats = db.get(FarmStats, farmId)
+    if not stats or (farmerId is not None and stats.farmerId != farmerId):
+        raise HTTPException(status_code=404, detail="Farm not found")
+
+    # check if farm belongs to authenticated farmer, admins can see any farm
+    if stats.farmerId != farmer_id and admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden: You can only access your own farms")
+    return stats
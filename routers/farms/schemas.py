@@ -18,3 +18,16 @@ class FarmOut(BaseModel):
 
 	class Config:
 		from_attributes = True
+
+
+class FarmStatsOut(BaseModel):
+	farmId: int
+	farmerId: int
+	seasonCount: int
+	activeSeasonCount: int
+	estimatedCostUgx: int
+	actualCostUgx: int
+	overdueCount: int
+
+	class Config:
+		from_attributes = True
@@ -0,0 +1,95 @@
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import FileResponse
+from routers.reports.schemas import SeasonReportCreate, ReportJobOut
+from database import SessionLocal
+from models import ReportJob, JobStatus
+from dependencies import verify_optional_token
+from jobs import JobQueueFull, report_path, submit_job
+from utils import settings
+
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+MEDIA_TYPES = {"csv": "text/csv", "html": "text/html"}
+
+
+def _job_out(job: ReportJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "format": job.format,
+        "status": job.status.value,
+        "params": json.loads(job.params),
+        "farmerId": job.farmerId,
+        "rowCount": job.rowCount,
+        "error": job.error,
+        "createdAt": job.createdAt,
+        "startedAt": job.startedAt,
+        "finishedAt": job.finishedAt,
+    }
+
+
+def _get_job(jobId: int, farmer_id: int | None, admin_key: str | None) -> ReportJob:
+    """Load a job, checking that it belongs to the farmer or that the admin key is valid."""
+    if farmer_id is None and admin_key is None:
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
+    if admin_key is not None and admin_key != settings.ADMIN_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+    # report jobs live on the first shard
+    with SessionLocal() as db:
+        job = db.get(ReportJob, jobId)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if admin_key is None and job.farmerId != farmer_id:
+        raise HTTPException(status_code=403, detail="Forbidden: You can only access your own reports")
+    return job
+
+
+# Submit a season plan vs actual report job
+@router.post("/season-summary", response_model=ReportJobOut, status_code=202)
+def submit_season_report(payload: SeasonReportCreate, farmer_id: int | None = Depends(verify_optional_token), admin_key: str | None = Header(default=None)):
+    """Queue a plan vs actual report over many seasons, generated in the background as CSV or printable HTML. Farmers get a report of their own seasons; admins (admin-key header) can report on any farmer, or on all seasons when farmerId is left out. Poll the job and download the result when it is DONE."""
+    if admin_key is not None:
+        # verify admin key
+        if admin_key != settings.ADMIN_KEY:
+            raise HTTPException(status_code=401, detail="Invalid admin key")
+        owner_id = None
+    else:
+        if farmer_id is None:
+            raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
+        if payload.farmerId is not None and payload.farmerId != farmer_id:
+            raise HTTPException(status_code=403, detail="Forbidden: You can only report on your own seasons")
+        payload.farmerId = farmer_id
+        owner_id = farmer_id
+
+    params = payload.model_dump(exclude={"format"})
+    with SessionLocal() as db:
+        try:
+            job = submit_job(db, "season_summary", payload.format.value, params, owner_id)
+        except JobQueueFull:
+            raise HTTPException(status_code=503, detail="Too many report jobs queued, retry later", headers={"Retry-After": "30"})
+        return _job_out(job)
+
+
+# Get a report job status
+@router.get("/{jobId}", response_model=ReportJobOut)
+def get_report_job(jobId: int, farmer_id: int | None = Depends(verify_optional_token), admin_key: str | None = Header(default=None)):
+    """Get the status of a report job. Only the farmer who requested it or an admin can see it."""
+    return _job_out(_get_job(jobId, farmer_id, admin_key))
+
+
+# Download a finished report
+@router.get("/{jobId}/download")
+def download_report(jobId: int, farmer_id: int | None = Depends(verify_optional_token), admin_key: str | None = Header(default=None)):
+    """Download the CSV or HTML file of a finished report job. Only the farmer who requested it or an admin can download it."""
+    job = _get_job(jobId, farmer_id, admin_key)
+    if job.status != JobStatus.DONE:
+        raise HTTPException(status_code=409, detail=f"Report is not ready, job status is {job.status.value}")
+
+    path = report_path(job)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=410, detail="Report file is no longer available")
+    return FileResponse(path, media_type=MEDIA_TYPES[job.format], filename=os.path.basename(path))
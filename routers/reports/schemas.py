@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+
+class ReportFormat(str, Enum):
+	csv = "csv"
+	html = "html"
+
+
+class SeasonReportCreate(BaseModel):
+	format: ReportFormat = ReportFormat.csv
+	farmerId: Optional[int] = None
+	cropName: Optional[str] = None
+	seasonName: Optional[str] = None
+
+
+class ReportJobOut(BaseModel):
+	id: int
+	kind: str
+	format: str
+	status: str
+	params: dict
+	farmerId: Optional[int] = None
+	rowCount: Optional[int] = None
+	error: Optional[str] = None
+	createdAt: datetime
+	startedAt: Optional[datetime] = None
+	finishedAt: Optional[datetime] = None
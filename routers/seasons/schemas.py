@@ -16,13 +16,13 @@ class UpdateSeason(BaseModel):
 class PlannedActivityCreate(BaseModel):
 	activityType: str
 	targetDate: date
-	estimatedCostUgx: float
+	estimatedCostUgx: int
 
 
 class ActualActivityCreate(BaseModel):
 	activityType: str
 	actualDate: date
-	actualCostUgx: float
+	actualCostUgx: int
 	notes: Optional[str] = None
 	plannedActivityId: Optional[int] = None
 
@@ -32,7 +32,7 @@ class PlannedActivityOut(BaseModel):
 	seasonPlanId: int
 	activityType: str
 	targetDate: date
-	estimatedCostUgx: float
+	estimatedCostUgx: int
 	status: str
 
 	class Config:
@@ -44,7 +44,7 @@ class ActualActivityOut(BaseModel):
 	seasonPlanId: int
 	activityType: str
 	actualDate: date
-	actualCostUgx: float
+	actualCostUgx: int
 	notes: Optional[str] = None
 	plannedActivityId: Optional[int] = None
 
@@ -62,9 +62,30 @@ class SeasonOut(BaseModel):
 		from_attributes = True
 
 
+class ForecastActivity(BaseModel):
+	activityType: str
+	targetDate: date
+	activitiesPerSeason: float
+	estimatedCostUgx: int
+	actualCostUgx: int
+
+
+class SeasonForecast(BaseModel):
+	basedOnSeasons: int
+	sizeAcres: float
+	startDate: date
+	projectedEstimatedCostUgx: int
+	projectedActualCostUgx: int
+	activities: List[ForecastActivity]
+
+
+class SeasonCreateOut(SeasonOut):
+	forecast: Optional[SeasonForecast] = None
+
+
 class SeasonSummary(BaseModel):
 	seasonId: int
-	totalEstimatedCostUgx: float
-	totalActualCostUgx: float
+	totalEstimatedCostUgx: int
+	totalActualCostUgx: int
 	overdueCount: int
 	activities: List[PlannedActivityOut]
@@ -1,25 +1,152 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+from functools import partial
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 from routers.seasons.schemas import (
     SeasonCreate,
     PlannedActivityCreate,
     ActualActivityCreate,
     SeasonOut,
+    SeasonCreateOut,
     UpdateSeason
 )
 from database import get_db
 from models import Farm, SeasonPlan, PlannedActivity, ActualActivity, StatusType
-from datetime import datetime, date
-from dependencies import verify_token, nairobi_tz
+from datetime import date
+from dependencies import verify_token
+from write_queue import run_write
+from ingest import IngestSummary, ndjson_chunks
+import rollups
+import outbox
+from snapshot_cache import snapshot_cache
+from overdue import mark_overdue
+from forecasting import forecast_season
 
 
 router = APIRouter(prefix="/seasons", tags=["seasons"])
 
+logger = logging.getLogger(__name__)
+
+
+def mark_overdue_activities(db: Session, season: SeasonPlan):
+    """If target date < today and status is not COMPLETED, mark as OVERDUE and update db and rollups."""
+    if mark_overdue(db, season.farm.farmerId, season.id):
+        snapshot_cache.invalidate(season.farm.farmerId)
+
+
+def _add_planned_activities(session: Session, season_id: int, farm_id: int, farmer_id: int, items: list[PlannedActivityCreate]):
+    """Insert planned activities into a season and update the rollups and outbox."""
+    added = []
+    for p in items:
+        # create planned activity
+        planned_activity = PlannedActivity(
+            seasonPlanId=season_id,
+            activityType=p.activityType,
+            targetDate=p.targetDate,
+            estimatedCostUgx=p.estimatedCostUgx,
+        )
+        # set initial status based on targetDate
+        if p.targetDate < date.today():
+            planned_activity.status = StatusType.OVERDUE
+        else:
+            planned_activity.status = StatusType.UPCOMING
+
+        session.add(planned_activity)
+        added.append(planned_activity)
+
+    # update farmer and farm rollups
+    session.flush()
+    estimated_cost = sum(p.estimatedCostUgx for p in items)
+    overdue = sum(1 for a in added if a.status == StatusType.OVERDUE)
+    rollups.season_changed(session, farm_id, farmer_id, overdue=overdue, estimated_cost=estimated_cost)
+    outbox.record_many(session, [
+        ("planned_activity.created", a.id, farmer_id, {
+            "seasonId": season_id,
+            "activityType": a.activityType,
+            "targetDate": a.targetDate,
+            "estimatedCostUgx": a.estimatedCostUgx,
+            "status": a.status.value,
+        })
+        for a in added
+    ])
+
+
+def _invalid_planned_activity_ids(session: Session, season_id: int, ids: list[int | None]) -> set[int]:
+    """Return the given planned activity ids that do not exist or belong to another season."""
+    ids = {i for i in ids if i}
+    if not ids:
+        return set()
+    valid = session.scalars(
+        select(PlannedActivity.id).where(PlannedActivity.id.in_(ids), PlannedActivity.seasonPlanId == season_id)
+    ).all()
+    return ids - set(valid)
+
+
+def _add_actual_activities(session: Session, season_id: int, farm_id: int, farmer_id: int, items: list[ActualActivityCreate]):
+    """Insert actual activities into a season, mark their planned activities COMPLETED and update
+    the rollups and outbox. plannedActivityIds must have been checked already."""
+    added = []
+    for p in items:
+        # create actual activity
+        item = ActualActivity(
+            seasonPlanId=season_id,
+            activityType=p.activityType,
+            actualDate=p.actualDate,
+            actualCostUgx=p.actualCostUgx,
+            notes=p.notes,
+            plannedActivityId=p.plannedActivityId,
+        )
+        session.add(item)
+        added.append(item)
+
+    # update planned activity status to COMPLETED. UPCOMING ones first: activities only ever
+    # go from UPCOMING to OVERDUE, so the second update sees every OVERDUE one and its
+    # returned rows are exactly the overdue activities this transaction completed
+    completed_ids = {p.plannedActivityId for p in items if p.plannedActivityId}
+    overdue_completed = 0
+    if completed_ids:
+        session.execute(
+            update(PlannedActivity)
+            .where(PlannedActivity.id.in_(completed_ids), PlannedActivity.status == StatusType.UPCOMING)
+            .values(status=StatusType.COMPLETED)
+        )
+        overdue_completed = len(session.scalars(
+            update(PlannedActivity)
+            .where(PlannedActivity.id.in_(completed_ids), PlannedActivity.status == StatusType.OVERDUE)
+            .values(status=StatusType.COMPLETED)
+            .returning(PlannedActivity.id)
+        ).all())
+
+    # update farmer and farm rollups
+    session.flush()
+    actual_cost = sum(p.actualCostUgx for p in items)
+    rollups.season_changed(session, farm_id, farmer_id, overdue=-overdue_completed, actual_cost=actual_cost)
+    outbox.record_many(session, [
+        ("actual_activity.created", a.id, farmer_id, {
+            "seasonId": season_id,
+            "activityType": a.activityType,
+            "actualDate": a.actualDate,
+            "actualCostUgx": a.actualCostUgx,
+            "notes": a.notes,
+            "plannedActivityId": a.plannedActivityId,
+        })
+        for a in added
+    ])
+    outbox.record_many(session, [
+        ("planned_activity.completed", a.plannedActivityId, farmer_id, {"seasonId": season_id, "actualActivityId": a.id})
+        for a in added
+        if a.plannedActivityId
+    ])
+
 
 # Create a new season plan
-@router.post("/", response_model=SeasonOut, status_code=201)
+@router.post("/", response_model=SeasonCreateOut, status_code=201)
 def create_season(payload: SeasonCreate, db: Session = Depends(get_db), farmer_id: int = Depends(verify_token)):
-    """Create a new season plan for a farm. Only the owner farmer can create a season for their farm."""
+    """Create a new season plan for a farm, with a cost and schedule forecast from past seasons
+    of the same crop and season. Only the owner farmer can create a season for their farm."""
     if not farmer_id:
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
     
@@ -32,17 +159,39 @@ def create_season(payload: SeasonCreate, db: Session = Depends(get_db), farmer_i
         raise HTTPException(status_code=403, detail="Forbidden: You can only create seasons for your own farms")
 
     # create season
-    season = SeasonPlan(
-        farmId=payload.farmId,
-        cropName=payload.cropName,
-        seasonName=payload.seasonName,
-    )
+    def create(session: Session):
+        season = SeasonPlan(
+            farmId=payload.farmId,
+            cropName=payload.cropName,
+            seasonName=payload.seasonName,
+        )
+        session.add(season)
+        session.flush()
+        rollups.season_created(session, payload.farmId, farmer_id)
+        outbox.record(
+            session, "season.created", season.id, farmer_id,
+            farmId=season.farmId, cropName=season.cropName, seasonName=season.seasonName,
+        )
+        return season
 
     # save to db
-    db.add(season)
-    db.commit()
-    db.refresh(season)
-    return season
+    season = run_write(db, create)
+    snapshot_cache.invalidate(farmer_id)
+
+    # project costs and schedule from other farms' seasons, scaled to this farm. the season
+    # is saved already, a failing forecast must not fail the request
+    try:
+        forecast = forecast_season(payload.cropName, payload.seasonName, float(farm.sizeAcres))
+    except Exception:
+        logger.exception("forecast failed for season %s", season.id)
+        forecast = None
+    return SeasonCreateOut(
+        id=season.id,
+        farmId=season.farmId,
+        cropName=season.cropName,
+        seasonName=season.seasonName,
+        forecast=forecast,
+    )
 
 
 # update season
@@ -61,15 +210,19 @@ def update_season(seasonId: int, payload: UpdateSeason, db: Session = Depends(ge
         raise HTTPException(status_code=403, detail="Forbidden: You can only update your own seasons")
 
     # update fields if provided
-    if payload.cropName is not None:
-        season.cropName = payload.cropName
-    if payload.seasonName is not None:
-        season.seasonName = payload.seasonName
+    def update(session: Session):
+        season = session.get(SeasonPlan, seasonId)
+        if payload.cropName is not None:
+            season.cropName = payload.cropName
+        if payload.seasonName is not None:
+            season.seasonName = payload.seasonName
+        session.flush()
+        outbox.record(session, "season.updated", season.id, farmer_id, **payload.model_dump(exclude_none=True))
+        return season
 
     # save to db
-    db.add(season)
-    db.commit()
-    db.refresh(season)
+    season = run_write(db, update)
+    snapshot_cache.invalidate(farmer_id)
     return season
 
 
@@ -88,23 +241,14 @@ def add_planned_activities(seasonId: int, payload: list[PlannedActivityCreate],
     # check if season belongs to the authenticated farmer
     if season.farm.farmerId != farmer_id:
         raise HTTPException(status_code=403, detail="Forbidden: You can only add activities to your own seasons")
-    for p in payload:
-        # create planned activity
-        planned_activity = PlannedActivity(
-            seasonPlanId=seasonId,
-            activityType=p.activityType,
-            targetDate=p.targetDate,
-            estimatedCostUgx=p.estimatedCostUgx,
-        )
-        # set initial status based on targetDate
-        if p.targetDate < date.today():
-            planned_activity.status = StatusType.OVERDUE
-        else:
-            planned_activity.status = StatusType.UPCOMING
+    farm_id = season.farmId
+
+    def add(session: Session):
+        _add_planned_activities(session, seasonId, farm_id, farmer_id, payload)
 
-        # save to db
-        db.add(planned_activity)
-    db.commit()
+    # save to db
+    run_write(db, add)
+    snapshot_cache.invalidate(farmer_id)
     return {"message": "Planned activities added successfully"}
     
 
@@ -127,30 +271,94 @@ def add_actual_activities(seasonId: int, payloads: list[ActualActivityCreate], d
     season = db.query(SeasonPlan).get(seasonId)
     if not season:
         raise HTTPException(status_code=404, detail="Season not found")
-    for p in payloads:
+    farm_id = season.farmId
+
+    def add(session: Session):
         # if plannedActivityId is provided, verify it exists and belongs to the season
-        if p.plannedActivityId:
-            planned_activity = db.query(PlannedActivity).get(p.plannedActivityId)
-            if not planned_activity or planned_activity.seasonPlanId != seasonId:
+        invalid = _invalid_planned_activity_ids(session, seasonId, [p.plannedActivityId for p in payloads])
+        for p in payloads:
+            if p.plannedActivityId in invalid:
                 raise HTTPException(status_code=400, detail=f"Invalid plannedActivityId: {p.plannedActivityId}")
-            
-            # update planned activity status to COMPLETED
-            planned_activity.status = StatusType.COMPLETED
-            db.add(planned_activity)
+        _add_actual_activities(session, seasonId, farm_id, farmer_id, payloads)
 
-        # create actual activity    
-        item = ActualActivity(
-            seasonPlanId=seasonId,
-            activityType=p.activityType,
-            actualDate=p.actualDate,
-            actualCostUgx=p.actualCostUgx,
-            notes=p.notes,
-            plannedActivityId=p.plannedActivityId,
-        )
-        db.add(item)
-        
-    db.commit()
+    # save to db
+    run_write(db, add)
+    snapshot_cache.invalidate(farmer_id)
     return {"message": "Actual activities added successfully"}
+
+
+def _own_season_farm_id(db: Session, season_id: int, farmer_id: int) -> int:
+    """Check that the season exists and belongs to the farmer, and return its farm id."""
+    season = db.query(SeasonPlan).get(season_id)
+    if not season:
+        raise HTTPException(status_code=404, detail="Season not found")
+    if season.farm.farmerId != farmer_id:
+        raise HTTPException(status_code=403, detail="Forbidden: You can only add activities to your own seasons")
+    return season.farmId
+
+
+def _chunk_failed(summary: IngestSummary, season_id: int, line: int) -> JSONResponse:
+    """Stop a streaming ingestion whose chunk from line could not be saved. Earlier chunks
+    are committed, so the summary of what was saved is returned with the error."""
+    logger.exception("saving the chunk from line %s into season %s failed", line, season_id)
+    summary.fail(line)
+    return JSONResponse(summary.as_dict(), status_code=500)
+
+
+# Stream planned activities into a season as NDJSON
+@router.post("/{seasonId}/planned-activities/stream", status_code=201)
+async def stream_planned_activities(seasonId: int, request: Request, db: Session = Depends(get_db), farmer_id: int = Depends(verify_token)):
+    """Add planned activities from an NDJSON body, one activity per line, for large backfills. Rows are validated and committed in chunks as the body arrives. Returns accepted and rejected counts with the line number and reason of each rejected row."""
+    if not farmer_id:
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
+    farm_id = await run_in_threadpool(_own_season_farm_id, db, seasonId, farmer_id)
+
+    summary = IngestSummary()
+    async for chunk in ndjson_chunks(request.stream(), PlannedActivityCreate, summary):
+        items = [row for _, row in chunk]
+
+        # save each chunk in its own transaction
+        try:
+            await run_in_threadpool(run_write, db, partial(_add_planned_activities, season_id=seasonId, farm_id=farm_id, farmer_id=farmer_id, items=items))
+        except Exception:
+            return _chunk_failed(summary, seasonId, chunk[0][0])
+        snapshot_cache.invalidate(farmer_id)
+        summary.accepted += len(items)
+        summary.chunks += 1
+
+    return summary.as_dict()
+
+
+# Stream actual activities into a season as NDJSON
+@router.post("/{seasonId}/actual-activities/stream", status_code=201)
+async def stream_actual_activities(seasonId: int, request: Request, db: Session = Depends(get_db), farmer_id: int = Depends(verify_token)):
+    """Add actual activities from an NDJSON body, one activity per line, for large backfills. Rows are validated and committed in chunks as the body arrives; rows with an invalid plannedActivityId are rejected. Returns accepted and rejected counts with the line number and reason of each rejected row."""
+    if not farmer_id:
+        raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
+    farm_id = await run_in_threadpool(_own_season_farm_id, db, seasonId, farmer_id)
+
+    summary = IngestSummary()
+    async for chunk in ndjson_chunks(request.stream(), ActualActivityCreate, summary):
+        def add(session: Session) -> list[tuple[int, ActualActivityCreate]]:
+            # rows pointing at a planned activity of another season are rejected, not the chunk
+            invalid = _invalid_planned_activity_ids(session, seasonId, [row.plannedActivityId for _, row in chunk])
+            items = [row for _, row in chunk if row.plannedActivityId not in invalid]
+            if items:
+                _add_actual_activities(session, seasonId, farm_id, farmer_id, items)
+            return [(line, row) for line, row in chunk if row.plannedActivityId in invalid]
+
+        # save each chunk in its own transaction
+        try:
+            rejected = await run_in_threadpool(run_write, db, add)
+        except Exception:
+            return _chunk_failed(summary, seasonId, chunk[0][0])
+        snapshot_cache.invalidate(farmer_id)
+        for line, row in rejected:
+            summary.reject(line, f"Invalid plannedActivityId: {row.plannedActivityId}")
+        summary.accepted += len(chunk) - len(rejected)
+        summary.chunks += 1
+
+    return summary.as_dict()
     
 
 # Get season details with planned and actual activities
@@ -159,7 +367,25 @@ def get_season_details(seasonId: int, db: Session = Depends(get_db), farmer_id:
     """Get season details with planned and actual activities. Only the owner farmer can access their seasons. If target date < today and status is not COMPLETED, mark as OVERDUE and update db."""
     if not farmer_id:
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
-    
+
+    # serve from the farmer's cached snapshot when available
+    snapshot = snapshot_cache.get(db, farmer_id)
+    if snapshot is not None and seasonId in snapshot.seasons:
+        cached = snapshot.seasons[seasonId]
+        return {
+            "season": {
+                "id": cached.id,
+                "farm_details": {
+                    "farmId": cached.farmId,
+                    "farmName": snapshot.farms[cached.farmId].name,
+                },
+                "cropName": cached.cropName,
+                "seasonName": cached.seasonName,
+            },
+            "planned_activities": [a._asdict() for a in cached.planned_activities],
+            "actual_activities": [a._asdict() for a in cached.actual_activities],
+        }
+
     # check if season exists
     season = db.query(SeasonPlan).get(seasonId)
     if not season:
@@ -170,13 +396,9 @@ def get_season_details(seasonId: int, db: Session = Depends(get_db), farmer_id:
         raise HTTPException(status_code=403, detail="Forbidden: You can only access your own seasons")
     
 
-    # If target date < today and status is not COMPLETED, mark as OVERDUE and update db and count
-    for activity in season.planned_activities:
-        if activity.targetDate < datetime.now(nairobi_tz).date() and activity.status != StatusType.COMPLETED:
-            activity.status = StatusType.OVERDUE
-            db.add(activity)
-            db.commit()
-    
+    # If target date < today and status is not COMPLETED, mark as OVERDUE and update db
+    mark_overdue_activities(db, season)
+
     # return season details with planned activities and actual activities details
     return {
         "season": {
@@ -199,7 +421,20 @@ def get_season_summary(seasonId: int, db: Session = Depends(get_db), farmer_id:
     """Get season summary. Only the owner farmer can access their seasons. If target date < today and status is not COMPLETED, mark as OVERDUE and update db and compute counts and costs."""
     if not farmer_id:
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid Authorization token")
-    
+
+    # serve from the farmer's cached snapshot when available
+    snapshot = snapshot_cache.get(db, farmer_id)
+    if snapshot is not None and seasonId in snapshot.seasons:
+        cached = snapshot.seasons[seasonId]
+        return {
+            "seasonId": cached.id,
+            "totalEstimatedCostUgx": cached.totalEstimatedCostUgx,
+            "totalActualCostUgx": cached.totalActualCostUgx,
+            "activitiesUpcomingCount": cached.upcomingCount,
+            "activitiesCompletedCount": cached.completedCount,
+            "activitiesOverdueCount": cached.overdueCount,
+        }
+
     # check if season exists
     season = db.query(SeasonPlan).get(seasonId)
     if not season:
@@ -209,29 +444,30 @@ def get_season_summary(seasonId: int, db: Session = Depends(get_db), farmer_id:
     if season.farm.farmerId != farmer_id:
         raise HTTPException(status_code=403, detail="Forbidden: You can only access your own seasons")
 
+    # if If target date < today and status is not COMPLETED, mark as OVERDUE and update db
+    mark_overdue_activities(db, season)
+
     # compute counts of planned activities by status
-    upcoming_count = 0
-    completed_count = 0
-    overdue_count = 0
-
-    for activity in season.planned_activities:
-        # if If target date < today and status is not COMPLETED, mark as OVERDUE and update db and count
-        if activity.targetDate < datetime.now(nairobi_tz).date() and activity.status != StatusType.COMPLETED:
-            activity.status = StatusType.OVERDUE
-            db.add(activity)
-            db.commit()
-
-        # count by status and increment respective counters
-        if activity.status == StatusType.UPCOMING:
-            upcoming_count += 1
-        elif activity.status == StatusType.COMPLETED:
-            completed_count += 1
-        elif activity.status == StatusType.OVERDUE:
-            overdue_count += 1
-
-    # compute total estimated cost and total actual cost
-    total_estimated_cost = sum([a.estimatedCostUgx for a in season.planned_activities])
-    total_actual_cost = sum([a.actualCostUgx for a in season.actual_activities])
+    status_counts = dict(
+        db.execute(
+            select(PlannedActivity.status, func.count())
+            .where(PlannedActivity.seasonPlanId == season.id)
+            .group_by(PlannedActivity.status)
+        ).all()
+    )
+    upcoming_count = status_counts.get(StatusType.UPCOMING, 0)
+    completed_count = status_counts.get(StatusType.COMPLETED, 0)
+    overdue_count = status_counts.get(StatusType.OVERDUE, 0)
+
+    # compute total estimated cost and total actual cost as integer sums in the db
+    total_estimated_cost = db.scalar(
+        select(func.coalesce(func.sum(PlannedActivity.estimatedCostUgx), 0))
+        .where(PlannedActivity.seasonPlanId == season.id)
+    )
+    total_actual_cost = db.scalar(
+        select(func.coalesce(func.sum(ActualActivity.actualCostUgx), 0))
+        .where(ActualActivity.seasonPlanId == season.id)
+    )
 
     return {
         "seasonId": season.id,
@@ -0,0 +1,160 @@
+"""Plan vs actual report over many seasons, written to CSV or printable HTML.
+
+Runs in a report worker process (see jobs.py). Per season totals and counts are computed by
+the database in one grouped query per shard and streamed to the file in batches, so a report
+over thousands of seasons never holds them all in memory. As in the activity calendar,
+statuses are evaluated as of today: past activities that are not COMPLETED count as overdue.
+"""
+import csv
+import html
+import os
+from datetime import datetime
+from sqlalchemy import case, create_engine, func, select
+from sqlalchemy.pool import NullPool
+from dependencies import nairobi_tz
+from models import Farm, Farmer, SeasonPlan, PlannedActivity, ActualActivity, StatusType
+
+
+COLUMNS = [
+    "seasonId",
+    "farmerId",
+    "farmerName",
+    "farmId",
+    "farmName",
+    "cropName",
+    "seasonName",
+    "totalEstimatedCostUgx",
+    "totalActualCostUgx",
+    "varianceUgx",
+    "activitiesUpcomingCount",
+    "activitiesCompletedCount",
+    "activitiesOverdueCount",
+]
+
+FETCH_BATCH = 1000
+
+
+def report_query(params: dict, today):
+    """One row per season matching the report filters, with its totals and counts."""
+    pending = PlannedActivity.status != StatusType.COMPLETED
+    planned = (
+        select(
+            PlannedActivity.seasonPlanId.label("seasonPlanId"),
+            func.sum(PlannedActivity.estimatedCostUgx).label("estimated"),
+            func.sum(case((pending & (PlannedActivity.targetDate >= today), 1), else_=0)).label("upcoming"),
+            func.sum(case((PlannedActivity.status == StatusType.COMPLETED, 1), else_=0)).label("completed"),
+            func.sum(case((pending & (PlannedActivity.targetDate < today), 1), else_=0)).label("overdue"),
+        )
+        .group_by(PlannedActivity.seasonPlanId)
+        .subquery()
+    )
+    actual = (
+        select(
+            ActualActivity.seasonPlanId.label("seasonPlanId"),
+            func.sum(ActualActivity.actualCostUgx).label("actual"),
+        )
+        .group_by(ActualActivity.seasonPlanId)
+        .subquery()
+    )
+
+    estimated = func.coalesce(planned.c.estimated, 0)
+    actual_cost = func.coalesce(actual.c.actual, 0)
+    query = (
+        select(
+            SeasonPlan.id,
+            Farm.farmerId,
+            Farmer.name,
+            Farm.id,
+            Farm.name,
+            SeasonPlan.cropName,
+            SeasonPlan.seasonName,
+            estimated,
+            actual_cost,
+            actual_cost - estimated,
+            func.coalesce(planned.c.upcoming, 0),
+            func.coalesce(planned.c.completed, 0),
+            func.coalesce(planned.c.overdue, 0),
+        )
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .join(Farmer, Farm.farmerId == Farmer.id)
+        .outerjoin(planned, planned.c.seasonPlanId == SeasonPlan.id)
+        .outerjoin(actual, actual.c.seasonPlanId == SeasonPlan.id)
+        .order_by(SeasonPlan.id)
+    )
+    if params.get("farmerId") is not None:
+        query = query.where(Farm.farmerId == params["farmerId"])
+    if params.get("cropName"):
+        query = query.where(SeasonPlan.cropName == params["cropName"])
+    if params.get("seasonName"):
+        query = query.where(SeasonPlan.seasonName == params["seasonName"])
+    return query
+
+
+def _rows(database_urls: list[str], params: dict):
+    """Stream report rows from every shard."""
+    today = datetime.now(nairobi_tz).date()
+    query = report_query(params, today)
+    for url in database_urls:
+        engine = create_engine(url, poolclass=NullPool)
+        try:
+            with engine.connect() as connection:
+                result = connection.execution_options(yield_per=FETCH_BATCH).execute(query)
+                for partition in result.partitions():
+                    yield from partition
+        finally:
+            engine.dispose()
+
+
+def _write_csv(f, rows) -> int:
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _write_html(f, rows, params: dict) -> int:
+    filters = ", ".join(f"{name}: {value}" for name, value in params.items() if value is not None) or "all seasons"
+    f.write(
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Season plan vs actual report</title>\n"
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse;font-size:12px}"
+        "th,td{border:1px solid #999;padding:2px 6px}td.n{text-align:right}"
+        "thead{display:table-header-group}tr{page-break-inside:avoid}</style></head><body>\n"
+        f"<h1>Season plan vs actual report</h1>\n<p>{html.escape(filters)}. "
+        f"Generated {datetime.now(nairobi_tz):%Y-%m-%d %H:%M} (Africa/Nairobi).</p>\n"
+        "<table><thead><tr>" + "".join(f"<th>{name}</th>" for name in COLUMNS) + "</tr></thead><tbody>\n"
+    )
+    count = 0
+    totals = [0, 0, 0]
+    for row in rows:
+        cells = []
+        for value in row:
+            if isinstance(value, int):
+                cells.append(f"<td class=\"n\">{value:,}</td>")
+            else:
+                cells.append(f"<td>{html.escape(str(value))}</td>")
+        f.write("<tr>" + "".join(cells) + "</tr>\n")
+        totals = [total + value for total, value in zip(totals, row[7:10])]
+        count += 1
+    f.write(
+        "</tbody></table>\n"
+        f"<p>{count:,} seasons. Estimated {totals[0]:,} UGX, actual {totals[1]:,} UGX, variance {totals[2]:,} UGX.</p>\n"
+        "</body></html>\n"
+    )
+    return count
+
+
+def generate_season_report(database_urls: list[str], params: dict, report_format: str, path: str) -> int:
+    """Write the report to path and return the number of seasons in it. The file only appears
+    once it is complete."""
+    partial_path = path + ".part"
+    with open(partial_path, "w", newline="", encoding="utf-8") as f:
+        rows = _rows(database_urls, params)
+        if report_format == "html":
+            count = _write_html(f, rows, params)
+        else:
+            count = _write_csv(f, rows)
+    os.replace(partial_path, path)
+    return count
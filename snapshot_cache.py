@@ -0,0 +1,276 @@
+"""In-process cache of per farmer snapshots of farms, seasons and activities.
+
+A snapshot holds a farmer's whole domain as compact named tuples rather than ORM objects,
+and the read endpoints in farms.py and seasons.py serve from it directly. Snapshots are
+evicted least recently used first to stay within SNAPSHOT_CACHE_MAX_BYTES (0 disables the
+cache), and the write endpoints invalidate the farmer's snapshot as soon as they commit.
+
+A miss first marks the farmer's activities that are past their target date as OVERDUE (see
+overdue.py), so a snapshot's statuses are current when it is loaded. Once one of its
+UPCOMING activities goes past its target date the snapshot is loaded again.
+
+The cache is per process and invalidation only reaches the process that handled the write,
+so it is only safe with a single server process. It stays disabled when WEB_CONCURRENCY,
+which uvicorn and gunicorn take as their default worker count, asks for more than one.
+"""
+import itertools
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import NamedTuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from dependencies import nairobi_tz
+from models import Farm, SeasonPlan, PlannedActivity, ActualActivity, StatusType
+from overdue import mark_overdue
+from utils import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class FarmRecord(NamedTuple):
+    id: int
+    farmerId: int
+    name: str
+    sizeAcres: float
+
+
+class PlannedActivityRecord(NamedTuple):
+    id: int
+    seasonPlanId: int
+    activityType: str
+    targetDate: date
+    estimatedCostUgx: int
+    status: StatusType
+
+
+class ActualActivityRecord(NamedTuple):
+    id: int
+    seasonPlanId: int
+    activityType: str
+    actualDate: date
+    actualCostUgx: int
+    notes: str | None
+    plannedActivityId: int | None
+
+
+class SeasonRecord(NamedTuple):
+    id: int
+    farmId: int
+    cropName: str
+    seasonName: str
+    planned_activities: tuple[PlannedActivityRecord, ...]
+    actual_activities: tuple[ActualActivityRecord, ...]
+    totalEstimatedCostUgx: int
+    totalActualCostUgx: int
+    upcomingCount: int
+    completedCount: int
+    overdueCount: int
+
+
+class FarmerSnapshot(NamedTuple):
+    farmerId: int
+    farms: dict[int, FarmRecord]
+    seasons: dict[int, SeasonRecord]
+    # earliest target date of an UPCOMING activity, the snapshot is stale once it is past
+    nextDueDate: date | None
+    sizeBytes: int
+
+
+def _sizeof(records) -> int:
+    """Rough memory size of a collection of records and their fields."""
+    size = sys.getsizeof(records)
+    for record in records:
+        size += sys.getsizeof(record) + sum(sys.getsizeof(field) for field in record)
+    return size
+
+
+def load_snapshot(db: Session, farmer_id: int) -> FarmerSnapshot:
+    """Load a farmer's farms, seasons and activities with one query per table."""
+    farms = {
+        row[0]: FarmRecord(row[0], row[1], row[2], float(row[3]))
+        for row in db.execute(
+            select(Farm.id, Farm.farmerId, Farm.name, Farm.sizeAcres)
+            .where(Farm.farmerId == farmer_id)
+            .order_by(Farm.id)
+        )
+    }
+
+    planned: dict[int, list] = {}
+    for row in db.execute(
+        select(
+            PlannedActivity.id,
+            PlannedActivity.seasonPlanId,
+            PlannedActivity.activityType,
+            PlannedActivity.targetDate,
+            PlannedActivity.estimatedCostUgx,
+            PlannedActivity.status,
+        )
+        .join(SeasonPlan, PlannedActivity.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(Farm.farmerId == farmer_id)
+        .order_by(PlannedActivity.id)
+    ):
+        planned.setdefault(row[1], []).append(PlannedActivityRecord(*row))
+
+    actual: dict[int, list] = {}
+    for row in db.execute(
+        select(
+            ActualActivity.id,
+            ActualActivity.seasonPlanId,
+            ActualActivity.activityType,
+            ActualActivity.actualDate,
+            ActualActivity.actualCostUgx,
+            ActualActivity.notes,
+            ActualActivity.plannedActivityId,
+        )
+        .join(SeasonPlan, ActualActivity.seasonPlanId == SeasonPlan.id)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(Farm.farmerId == farmer_id)
+        .order_by(ActualActivity.id)
+    ):
+        actual.setdefault(row[1], []).append(ActualActivityRecord(*row))
+
+    seasons = {}
+    next_due_date = None
+    size = _sizeof(farms.values())
+    for season_id, farm_id, crop_name, season_name in db.execute(
+        select(SeasonPlan.id, SeasonPlan.farmId, SeasonPlan.cropName, SeasonPlan.seasonName)
+        .join(Farm, SeasonPlan.farmId == Farm.id)
+        .where(Farm.farmerId == farmer_id)
+        .order_by(SeasonPlan.id)
+    ):
+        season_planned = tuple(planned.get(season_id, ()))
+        season_actual = tuple(actual.get(season_id, ()))
+        upcoming = [a.targetDate for a in season_planned if a.status == StatusType.UPCOMING]
+        if upcoming and (next_due_date is None or min(upcoming) < next_due_date):
+            next_due_date = min(upcoming)
+
+        seasons[season_id] = SeasonRecord(
+            id=season_id,
+            farmId=farm_id,
+            cropName=crop_name,
+            seasonName=season_name,
+            planned_activities=season_planned,
+            actual_activities=season_actual,
+            totalEstimatedCostUgx=sum(a.estimatedCostUgx for a in season_planned),
+            totalActualCostUgx=sum(a.actualCostUgx for a in season_actual),
+            upcomingCount=len(upcoming),
+            completedCount=sum(1 for a in season_planned if a.status == StatusType.COMPLETED),
+            overdueCount=sum(1 for a in season_planned if a.status == StatusType.OVERDUE),
+        )
+        size += sys.getsizeof(seasons[season_id]) + _sizeof(season_planned) + _sizeof(season_actual)
+
+    size += sys.getsizeof(farms) + sys.getsizeof(seasons)
+    return FarmerSnapshot(farmer_id, farms, seasons, next_due_date, size)
+
+
+class SnapshotCache:
+    """LRU cache of farmer snapshots bounded by an approximate memory budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._snapshots: OrderedDict[int, FarmerSnapshot] = OrderedDict()
+        # farmer id -> token of the load in flight, dropped when the farmer is invalidated
+        self._loading: dict[int, int] = {}
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, db: Session, farmer_id: int) -> FarmerSnapshot | None:
+        """Return the farmer's snapshot, loading it on a miss. None when the cache is disabled;
+        the caller then reads from the database."""
+        if not self.enabled:
+            return None
+
+        today = datetime.now(nairobi_tz).date()
+        with self._lock:
+            snapshot = self._snapshots.get(farmer_id)
+            if snapshot is not None:
+                if snapshot.nextDueDate is None or snapshot.nextDueDate >= today:
+                    self._snapshots.move_to_end(farmer_id)
+                    self.hits += 1
+                    return snapshot
+                # an activity has gone overdue since the snapshot was loaded
+                self._drop(farmer_id)
+            self.misses += 1
+
+        # store the statuses of all the farmer's seasons first, the snapshot then stays
+        # valid until its next due date
+        mark_overdue(db, farmer_id)
+
+        with self._lock:
+            token = next(self._tokens)
+            self._loading[farmer_id] = token
+        snapshot = load_snapshot(db, farmer_id)
+
+        with self._lock:
+            # only keep the snapshot if no write invalidated the farmer while it was loading
+            if self._loading.get(farmer_id) == token:
+                del self._loading[farmer_id]
+                self._put(farmer_id, snapshot)
+        return snapshot
+
+    def _put(self, farmer_id: int, snapshot: FarmerSnapshot):
+        self._drop(farmer_id)
+        if snapshot.sizeBytes > self.max_bytes:
+            return
+        self._snapshots[farmer_id] = snapshot
+        self.used_bytes += snapshot.sizeBytes
+        while self.used_bytes > self.max_bytes:
+            _, evicted = self._snapshots.popitem(last=False)
+            self.used_bytes -= evicted.sizeBytes
+            self.evictions += 1
+
+    def _drop(self, farmer_id: int):
+        snapshot = self._snapshots.pop(farmer_id, None)
+        if snapshot is not None:
+            self.used_bytes -= snapshot.sizeBytes
+
+    def invalidate(self, farmer_id: int):
+        """Forget the farmer's snapshot. Called by the write endpoints after they commit."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._drop(farmer_id)
+            self._loading.pop(farmer_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._snapshots),
+                "usedBytes": self.used_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def cache_budget() -> int:
+    """SNAPSHOT_CACHE_MAX_BYTES, or 0 when several server processes share the database."""
+    workers = os.environ.get("WEB_CONCURRENCY", "1").strip()
+    if settings.SNAPSHOT_CACHE_MAX_BYTES and workers.isdigit() and int(workers) > 1:
+        logger.warning("snapshot cache disabled: WEB_CONCURRENCY=%s, invalidation would only reach one worker", workers)
+        return 0
+    return settings.SNAPSHOT_CACHE_MAX_BYTES
+
+
+snapshot_cache = SnapshotCache(cache_budget())
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import httpx
+import pytest
+from admission import AdmissionControlMiddleware
+from utils import settings
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    def configure(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(settings, name, value)
+    return configure
+
+
+class Backend:
+    """ASGI app standing in for the API. Activity batches wait until released."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = 0
+        self.bodies = []
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        self.bodies.append(body)
+        self.started += 1
+        if scope["path"].startswith("/seasons/"):
+            await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def client(app, ip="1.1.1.1"):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 1234)), base_url="http://test")
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+async def login(app, phone_number, ip="1.1.1.1", headers=None):
+    async with client(app, ip) as c:
+        return await c.post("/farmers/login", json={"phoneNumber": phone_number, "password": "pw"}, headers=headers)
+
+
+async def test_full_queue_is_shed_with_503(configure):
+    configure(ADMISSION_BULK_CONCURRENCY=1, ADMISSION_BULK_QUEUE=0, ADMISSION_QUEUE_TIMEOUT_SECONDS=5)
+    backend = Backend()
+    app = AdmissionControlMiddleware(backend)
+
+    async with client(app) as c:
+        first = asyncio.create_task(c.post("/seasons/1/planned-activities", json=[]))
+        await wait_for(lambda: backend.started == 1)
+
+        shed = await c.post("/seasons/1/planned-activities", json=[])
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "5"
+
+        # cheap routes are not limited
+        assert (await c.get("/farms/")).status_code == 200
+
+        backend.release.set()
+        assert (await first).status_code == 200
+        assert (await c.post("/seasons/1/planned-activities", json=[])).status_code == 200
+
+
+async def test_queued_request_waits_for_a_slot_then_times_out(configure):
+    configure(ADMISSION_BULK_CONCURRENCY=1, ADMISSION_BULK_QUEUE=4, ADMISSION_QUEUE_TIMEOUT_SECONDS=0.2)
+    backend = Backend()
+    app = AdmissionControlMiddleware(backend)
+
+    async with client(app) as c:
+        first = asyncio.create_task(c.post("/seasons/1/actual-activities", json=[]))
+        await wait_for(lambda: backend.started == 1)
+
+        # nobody frees the slot within the timeout
+        timed_out = await c.post("/seasons/1/actual-activities", json=[])
+        assert timed_out.status_code == 503
+        assert timed_out.headers["Retry-After"] == "1"
+
+        # a slot freed while waiting is taken
+        second = asyncio.create_task(c.post("/seasons/1/actual-activities", json=[]))
+        await asyncio.sleep(0.05)
+        backend.release.set()
+        assert (await first).status_code == 200
+        assert (await second).status_code == 200
+    assert backend.started == 2
+
+
+async def test_login_is_rate_limited_per_ip_and_per_phone_number(configure):
+    configure(LOGIN_RATE_PER_MINUTE=1, LOGIN_RATE_BURST=2)
+    backend = Backend()
+    app = AdmissionControlMiddleware(backend)
+
+    assert (await login(app, "0700000001")).status_code == 200
+    assert (await login(app, "0700000002")).status_code == 200
+    limited = await login(app, "0700000003")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) > 0
+    # the body read for the phone number still reaches the app
+    assert [json.loads(body)["phoneNumber"] for body in backend.bodies] == ["0700000001", "0700000002"]
+
+    # one phone number from many ips
+    assert (await login(app, "0700000009", ip="2.2.2.2")).status_code == 200
+    assert (await login(app, "0700000009", ip="3.3.3.3")).status_code == 200
+    assert (await login(app, "0700000009", ip="4.4.4.4")).status_code == 429
+
+
+async def test_login_ip_comes_from_trusted_proxies_only(configure):
+    configure(LOGIN_RATE_PER_MINUTE=1, LOGIN_RATE_BURST=2, ADMISSION_TRUSTED_PROXIES="10.0.0.1")
+    app = AdmissionControlMiddleware(Backend())
+
+    # behind the proxy every request comes from 10.0.0.1, clients are told apart by X-Forwarded-For
+    for client_ip in ("5.5.5.5", "6.6.6.6"):
+        for attempt in range(2):
+            response = await login(app, f"07{client_ip}{attempt}", ip="10.0.0.1", headers={"X-Forwarded-For": client_ip})
+            assert response.status_code == 200
+    # addresses a client puts in front of the proxy's own entry are ignored
+    spoofed = await login(app, "0711", ip="10.0.0.1", headers={"X-Forwarded-For": "7.7.7.7, 5.5.5.5"})
+    assert spoofed.status_code == 429
+
+    # X-Forwarded-For from anyone else is not trusted
+    for attempt in range(2):
+        response = await login(app, f"0712{attempt}", ip="8.8.8.8", headers={"X-Forwarded-For": f"9.9.9.{attempt}"})
+        assert response.status_code == 200
+    assert (await login(app, "0713", ip="8.8.8.8", headers={"X-Forwarded-For": "9.9.9.9"})).status_code == 429
@@ -0,0 +1,47 @@
+import threading
+import time
+from types import SimpleNamespace
+import forecasting
+from forecasting import ForecastCache
+
+
+def wait_until_loaded(cache):
+    for _ in range(500):
+        with cache._lock:
+            if not cache._pending:
+                return
+        time.sleep(0.01)
+    raise AssertionError("loads did not finish")
+
+
+def test_cache_is_bounded_and_loaded_by_one_thread(monkeypatch):
+    loads = []
+    threads = set()
+
+    def load_history(db, crop_name):
+        loads.append(crop_name)
+        threads.add(threading.get_ident())
+        time.sleep(0.005)
+        return SimpleNamespace(loadedAt=time.monotonic(), plannedType=[], actualType=[])
+
+    monkeypatch.setattr(forecasting, "load_history", load_history)
+    cache = ForecastCache(ttl_seconds=300, max_crops=3)
+
+    # a client cycling through crop names
+    for i in range(100):
+        assert cache.get(f"crop {i}") is None
+        assert len(cache._pending) <= 3
+    wait_until_loaded(cache)
+
+    assert len(cache._histories) <= 3
+    assert len(threads) == 1
+    assert len(loads) < 100
+
+    # the most recently used crops are kept
+    for crop_name in ("a", "b", "c"):
+        cache.get(crop_name)
+        wait_until_loaded(cache)
+    assert cache.get("a") is not None
+    cache.get("d")
+    wait_until_loaded(cache)
+    assert list(cache._histories) == ["c", "a", "d"]
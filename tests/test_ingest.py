@@ -0,0 +1,181 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import Session
+import rollups
+import routers.seasons.seasons as seasons_module
+from database import get_db
+from dependencies import verify_token
+from models import Base, Farmer, Farm, SeasonPlan, PlannedActivity, ActualActivity, FarmerStats, FarmStats
+from utils import settings
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ingest.db'}",
+        connect_args={"check_same_thread": False, "timeout": 60},
+        pool_size=20,
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Farmer(id=1, name="Farmer", phoneNumber="0700", hashedPassword="x"))
+        for farm_id in (1, 2):
+            db.add(Farm(id=farm_id, farmerId=1, name=f"Farm {farm_id}", sizeAcres=2))
+            db.add(SeasonPlan(id=farm_id, farmId=farm_id, cropName="Maize", seasonName="2026A"))
+        db.flush()
+        rollups.rebuild_rollups(db)
+        db.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_CHUNK_SIZE", 3)
+    monkeypatch.setattr(settings, "INGEST_MAX_LINE_BYTES", 200)
+
+    def get_test_db():
+        with Session(engine) as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(seasons_module.router)
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[verify_token] = lambda: 1
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def planned(days=30, cost=1000):
+    return {"activityType": "PLANTING", "targetDate": str(date.today() + timedelta(days=days)), "estimatedCostUgx": cost}
+
+
+def ndjson(*rows, piece=16):
+    """An NDJSON body sent in small pieces, so lines arrive split across reads."""
+    body = "".join((row if isinstance(row, str) else json.dumps(row)) + "\n" for row in rows).encode()
+    return (body[i:i + piece] for i in range(0, len(body), piece))
+
+
+def count(engine, model, season_id=1):
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(model).where(model.seasonPlanId == season_id))
+
+
+def rollup_rows(engine):
+    with Session(engine) as db:
+        return (
+            [tuple(row) for row in db.execute(select(FarmerStats.activeSeasonCount, FarmerStats.estimatedCostUgx, FarmerStats.actualCostUgx, FarmerStats.overdueCount))],
+            [tuple(row) for row in db.execute(select(FarmStats.farmId, FarmStats.activeSeasonCount, FarmStats.estimatedCostUgx, FarmStats.actualCostUgx, FarmStats.overdueCount).order_by(FarmStats.farmId))],
+        )
+
+
+def assert_rollups_match_rebuild(engine):
+    maintained = rollup_rows(engine)
+    with Session(engine) as db:
+        rollups.rebuild_rollups(db)
+        db.commit()
+    assert maintained == rollup_rows(engine)
+
+
+def test_rows_are_committed_in_chunks(engine, client):
+    commits = []
+    event.listen(engine, "commit", lambda connection: commits.append(1))
+
+    response = client.post("/seasons/1/planned-activities/stream", content=ndjson(*[planned(cost=100 * i) for i in range(8)]))
+
+    assert response.status_code == 201
+    assert response.json() == {"accepted": 8, "rejected": 0, "chunks": 3, "errors": [], "errorsTruncated": False, "failedFromLine": None}
+    assert len(commits) == 3
+    assert count(engine, PlannedActivity) == 8
+    assert_rollups_match_rebuild(engine)
+
+
+def test_rejected_lines_are_reported_by_line_number(engine, client):
+    body = ndjson(
+        planned(),
+        "{not json",
+        "",
+        {"activityType": "PLANTING", "targetDate": "2026-03-01"},
+        planned(cost=1.5),
+        planned(),
+    )
+    response = client.post("/seasons/1/planned-activities/stream", content=body)
+
+    assert response.status_code == 201
+    summary = response.json()
+    assert (summary["accepted"], summary["rejected"]) == (2, 3)
+    assert [(error["line"], error["error"]) for error in summary["errors"]] == [
+        (2, "invalid JSON"),
+        (4, "estimatedCostUgx: Field required"),
+        (5, "estimatedCostUgx: Input should be a valid integer, got a number with a fractional part"),
+    ]
+    assert count(engine, PlannedActivity) == 2
+
+
+def test_actual_rows_for_another_seasons_activity_are_rejected(engine, client):
+    client.post("/seasons/1/planned-activities/stream", content=ndjson(planned(), planned()))
+    client.post("/seasons/2/planned-activities/stream", content=ndjson(planned()))
+    actual = {"activityType": "PLANTING", "actualDate": str(date.today()), "actualCostUgx": 900}
+
+    response = client.post("/seasons/1/actual-activities/stream", content=ndjson(
+        {**actual, "plannedActivityId": 1},
+        {**actual, "plannedActivityId": 3},
+        {**actual, "plannedActivityId": 2},
+        actual,
+    ))
+
+    summary = response.json()
+    assert (summary["accepted"], summary["rejected"], summary["chunks"]) == (3, 1, 2)
+    assert summary["errors"] == [{"line": 2, "error": "Invalid plannedActivityId: 3"}]
+    assert count(engine, ActualActivity) == 3
+    assert_rollups_match_rebuild(engine)
+
+
+def test_lines_over_the_limit_are_rejected_without_buffering_them(engine, client):
+    long_line = json.dumps({**planned(), "notes": "x" * 500})
+    response = client.post("/seasons/1/planned-activities/stream", content=ndjson(planned(), long_line, planned(), piece=64))
+
+    summary = response.json()
+    assert (summary["accepted"], summary["rejected"]) == (2, 1)
+    assert summary["errors"] == [{"line": 2, "error": "line longer than 200 bytes"}]
+
+
+def test_a_failing_chunk_stops_the_load_and_keeps_earlier_chunks(engine, client, monkeypatch):
+    add_planned_activities = seasons_module._add_planned_activities
+    calls = []
+
+    def fail_second_chunk(session, **kwargs):
+        calls.append(1)
+        add_planned_activities(session, **kwargs)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+
+    monkeypatch.setattr(seasons_module, "_add_planned_activities", fail_second_chunk)
+    response = client.post("/seasons/1/planned-activities/stream", content=ndjson(*[planned() for _ in range(8)]))
+
+    assert response.status_code == 500
+    summary = response.json()
+    assert (summary["accepted"], summary["chunks"], summary["failedFromLine"]) == (3, 1, 4)
+    # the failing chunk is rolled back as a whole, and nothing after it is loaded
+    assert count(engine, PlannedActivity) == 3
+    assert len(calls) == 2
+    assert_rollups_match_rebuild(engine)
+
+
+def test_parallel_streams_keep_rollups_equal_to_a_rebuild(engine, client):
+    def stream(i):
+        season_id = i % 2 + 1
+        rows = [planned(days=-2 if j % 2 else 30, cost=100) for j in range(7)]
+        return client.post(f"/seasons/{season_id}/planned-activities/stream", content=ndjson(*rows)).json()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        summaries = list(pool.map(stream, range(24)))
+
+    assert {summary["accepted"] for summary in summaries} == {7}
+    assert count(engine, PlannedActivity) + count(engine, PlannedActivity, season_id=2) == 24 * 7
+    assert_rollups_match_rebuild(engine)
@@ -0,0 +1,129 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+import rollups
+from models import Base, Farmer, Farm, SeasonPlan, PlannedActivity, FarmerStats, FarmStats, StatusType
+from routers.farms.farms import update_farm
+from routers.farms.schemas import UpdateFarm
+from routers.seasons.schemas import ActualActivityCreate, PlannedActivityCreate
+from routers.seasons.seasons import add_actual_activities, add_planned_activities, get_season_summary
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'rollups.db'}",
+        connect_args={"check_same_thread": False, "timeout": 60},
+        pool_size=20,
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def seed(engine, farms=2, stale=5):
+    """One farmer with a season on each farm, the first season with stale UPCOMING activities."""
+    with Session(engine) as db:
+        db.add(Farmer(id=1, name="Farmer", phoneNumber="0700", hashedPassword="x"))
+        seasons = []
+        for i in range(farms):
+            farm = Farm(farmerId=1, name=f"Farm {i}", sizeAcres=1)
+            db.add(farm)
+            db.flush()
+            season = SeasonPlan(farmId=farm.id, cropName="Maize", seasonName="2026A")
+            db.add(season)
+            db.flush()
+            seasons.append((farm.id, season.id))
+        for _ in range(stale):
+            db.add(PlannedActivity(
+                seasonPlanId=seasons[0][1],
+                activityType="WEEDING",
+                targetDate=date.today() - timedelta(days=3),
+                estimatedCostUgx=1000,
+                status=StatusType.UPCOMING,
+            ))
+        db.flush()
+        rollups.rebuild_rollups(db)
+        db.commit()
+    return seasons
+
+
+def stats(engine):
+    with Session(engine) as db:
+        farmer = db.execute(select(FarmerStats)).scalars().all()
+        farms = db.execute(select(FarmStats).order_by(FarmStats.farmId)).scalars().all()
+        return (
+            [(s.farmerId, s.farmCount, float(s.totalSizeAcres), s.seasonCount, s.activeSeasonCount,
+              s.estimatedCostUgx, s.actualCostUgx, s.overdueCount) for s in farmer],
+            [(s.farmId, s.seasonCount, s.activeSeasonCount, s.estimatedCostUgx, s.actualCostUgx, s.overdueCount) for s in farms],
+        )
+
+
+def rebuilt(engine):
+    with Session(engine) as db:
+        rollups.rebuild_rollups(db)
+        db.commit()
+    return stats(engine)
+
+
+def request(engine, endpoint, *args):
+    # every request gets its own session, as from get_db, with the write queue off
+    with Session(engine) as db:
+        return endpoint(*args, db=db, farmer_id=1)
+
+
+def test_parallel_writes_keep_rollups_equal_to_a_rebuild(engine):
+    seasons = seed(engine)
+    random.seed(1)
+
+    def planned(season_id):
+        past = random.random() < 0.5
+        activity = PlannedActivityCreate(
+            activityType="PLANTING",
+            targetDate=date.today() + timedelta(days=-2 if past else 30),
+            estimatedCostUgx=500,
+        )
+        return request(engine, add_planned_activities, season_id, [activity])
+
+    def complete(season_id):
+        with Session(engine) as db:
+            pending = db.scalars(select(PlannedActivity.id).where(
+                PlannedActivity.seasonPlanId == season_id, PlannedActivity.status != StatusType.COMPLETED,
+            )).all()
+        # completing the same activity twice must not count it twice
+        activities = [ActualActivityCreate(activityType="PLANTING", actualDate=date.today(), actualCostUgx=300, plannedActivityId=activity_id)
+                      for activity_id in random.sample(pending, min(2, len(pending)))]
+        return request(engine, add_actual_activities, season_id, activities)
+
+    def resize(farm_id):
+        return request(engine, update_farm, farm_id, UpdateFarm(sizeAcres=random.choice([1, 2.5, 4])))
+
+    def summary(season_id):
+        return request(engine, get_season_summary, season_id)
+
+    jobs = []
+    for i in range(120):
+        farm_id, season_id = seasons[i % len(seasons)]
+        jobs += [(planned, season_id), (complete, season_id), (resize, farm_id), (summary, seasons[0][1])]
+    random.shuffle(jobs)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for future in [pool.submit(job, arg) for job, arg in jobs]:
+            future.result()
+
+    assert stats(engine) == rebuilt(engine)
+
+
+def test_concurrent_reads_mark_overdue_activities_once(engine):
+    farm_id, season_id = seed(engine, farms=1, stale=5)[0]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        summaries = list(pool.map(lambda _: request(engine, get_season_summary, season_id), range(40)))
+
+    assert {s["activitiesOverdueCount"] for s in summaries} == {5}
+    farmer_stats, farm_stats = stats(engine)
+    assert farmer_stats[0][-1] == 5
+    assert farm_stats[0][-1] == 5
+    assert (farmer_stats, farm_stats) == rebuilt(engine)
@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+import snapshot_cache as snapshot_module
+from models import Base, Farmer, Farm, SeasonPlan, PlannedActivity, StatusType
+from snapshot_cache import SnapshotCache
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshots.db'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        yield db
+    engine.dispose()
+
+
+def add_farmer(db, farmer_id, farms=1, target_date=None):
+    db.add(Farmer(id=farmer_id, name=f"Farmer {farmer_id}", phoneNumber=f"0700{farmer_id}", hashedPassword="x"))
+    for i in range(farms):
+        farm = Farm(farmerId=farmer_id, name=f"Farm {farmer_id}.{i}", sizeAcres=2)
+        db.add(farm)
+        db.flush()
+        season = SeasonPlan(farmId=farm.id, cropName="Maize", seasonName="2026A")
+        db.add(season)
+        db.flush()
+        db.add(PlannedActivity(
+            seasonPlanId=season.id,
+            activityType="PLANTING",
+            targetDate=target_date or date.today() + timedelta(days=30),
+            estimatedCostUgx=1000,
+            status=StatusType.UPCOMING,
+        ))
+    db.commit()
+
+
+def test_read_after_write_sees_the_write(db):
+    cache = SnapshotCache(max_bytes=10_000_000)
+    add_farmer(db, 1)
+    assert [farm.name for farm in cache.get(db, 1).farms.values()] == ["Farm 1.0"]
+    assert cache.get(db, 1) is cache.get(db, 1)
+
+    # a write endpoint commits, then invalidates
+    db.add(Farm(farmerId=1, name="Farm 1.new", sizeAcres=1))
+    db.commit()
+    cache.invalidate(1)
+
+    assert [farm.name for farm in cache.get(db, 1).farms.values()] == ["Farm 1.0", "Farm 1.new"]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_snapshot_invalidated_while_loading_is_not_kept(db, monkeypatch):
+    cache = SnapshotCache(max_bytes=10_000_000)
+    add_farmer(db, 1)
+    load_snapshot = snapshot_module.load_snapshot
+
+    def load_then_write(db, farmer_id):
+        snapshot = load_snapshot(db, farmer_id)
+        # a write commits and invalidates after the load read the old data
+        cache.invalidate(farmer_id)
+        return snapshot
+
+    monkeypatch.setattr(snapshot_module, "load_snapshot", load_then_write)
+    assert cache.get(db, 1) is not None
+    assert cache.stats()["entries"] == 0
+
+    monkeypatch.setattr(snapshot_module, "load_snapshot", load_snapshot)
+    cache.get(db, 1)
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_snapshots_are_evicted_by_bytes(db):
+    for farmer_id in (1, 2, 3):
+        add_farmer(db, farmer_id, farms=3)
+    size = snapshot_module.load_snapshot(db, 1).sizeBytes
+    cache = SnapshotCache(max_bytes=size * 2 + size // 2)
+
+    cache.get(db, 1)
+    cache.get(db, 2)
+    cache.get(db, 1)  # 2 is now the least recently used
+    cache.get(db, 3)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["usedBytes"] <= stats["maxBytes"]
+    hits = stats["hits"]
+    cache.get(db, 1)
+    cache.get(db, 3)
+    assert cache.stats()["hits"] == hits + 2
+    cache.get(db, 2)
+    assert cache.stats()["misses"] == stats["misses"] + 1
+
+
+def test_snapshot_larger_than_the_budget_is_not_kept(db):
+    add_farmer(db, 1)
+    cache = SnapshotCache(max_bytes=1)
+    assert cache.get(db, 1) is not None
+    assert cache.stats()["entries"] == 0
+
+
+def test_overdue_activities_are_marked_before_loading(db):
+    cache = SnapshotCache(max_bytes=10_000_000)
+    add_farmer(db, 1, target_date=date.today() - timedelta(days=3))
+
+    snapshot = cache.get(db, 1)
+    (season,) = snapshot.seasons.values()
+    assert season.overdueCount == 1
+    assert db.scalar(select(PlannedActivity.status)) == StatusType.OVERDUE
+
+    # the snapshot is current, later reads hit
+    assert cache.get(db, 1) is snapshot
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_is_disabled_with_several_workers(monkeypatch):
+    monkeypatch.setattr(snapshot_module.settings, "SNAPSHOT_CACHE_MAX_BYTES", 1_000_000)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert snapshot_module.cache_budget() == 1_000_000
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert snapshot_module.cache_budget() == 1_000_000
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert snapshot_module.cache_budget() == 0
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'writes.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL)"))
+    yield engine
+    engine.dispose()
+
+
+def insert(name):
+    def op(db):
+        db.execute(text("INSERT INTO items (name) VALUES (:name)"), {"name": name})
+        return name
+    return op
+
+
+def failing(db):
+    db.execute(text("INSERT INTO items (name) VALUES ('failed')"))
+    raise ValueError("boom")
+
+
+def names(engine):
+    with engine.connect() as connection:
+        return sorted(connection.scalars(text("SELECT name FROM items")))
+
+
+def test_batch_is_committed_once(engine):
+    write_queue = WriteQueue(engine, window_ms=200)
+    commits = []
+    event.listen(write_queue.engine, "commit", lambda connection: commits.append(1))
+
+    seen_during_batch = []
+
+    def peek(db):
+        # another connection must not see the batch before its commit
+        seen_during_batch.extend(names(engine))
+        return "peek"
+
+    futures = [write_queue.submit(insert(f"item {i}")) for i in range(4)] + [write_queue.submit(peek)]
+    results = [future.result(timeout=5) for future in futures]
+    write_queue.stop()
+
+    assert results == ["item 0", "item 1", "item 2", "item 3", "peek"]
+    assert seen_during_batch == []
+    assert len(commits) == 1
+    assert names(engine) == ["item 0", "item 1", "item 2", "item 3"]
+
+
+def test_failing_op_only_rolls_back_itself(engine):
+    write_queue = WriteQueue(engine, window_ms=200)
+    commits = []
+    event.listen(write_queue.engine, "commit", lambda connection: commits.append(1))
+
+    futures = [write_queue.submit(insert("before")), write_queue.submit(failing), write_queue.submit(insert("after"))]
+    assert futures[0].result(timeout=5) == "before"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == "after"
+    write_queue.stop()
+
+    assert len(commits) == 1
+    assert names(engine) == ["after", "before"]
+
+
+def test_failed_commit_fails_every_op(engine):
+    write_queue = WriteQueue(engine, window_ms=200)
+
+    def fail_commit(connection):
+        raise RuntimeError("disk full")
+
+    event.listen(write_queue.engine, "commit", fail_commit)
+    futures = [write_queue.submit(insert(f"item {i}")) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    write_queue.stop()
+
+    assert names(engine) == []
@@ -14,6 +14,57 @@ class Settings(BaseSettings):
     # Admin Key
     ADMIN_KEY: str
 
+    # Write queue: group commit of small writes through a single writer
+    WRITE_QUEUE_ENABLED: bool = False
+    WRITE_QUEUE_WINDOW_MS: int = 5
+    WRITE_QUEUE_MAX_BATCH: int = 200
+
+    # Sharding: comma separated database urls, the first one also holds the farmer directory
+    SHARD_DATABASE_URLS: str = ""
+
+    # Admission control for expensive routes (login and activity batches)
+    ADMISSION_CONTROL_ENABLED: bool = False
+    ADMISSION_LOGIN_CONCURRENCY: int = 4
+    ADMISSION_LOGIN_QUEUE: int = 32
+    ADMISSION_BULK_CONCURRENCY: int = 4
+    ADMISSION_BULK_QUEUE: int = 16
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 5
+    LOGIN_RATE_PER_MINUTE: int = 30
+    LOGIN_RATE_BURST: int = 10
+    # comma separated proxy ips whose X-Forwarded-For is trusted for the login ip limit
+    ADMISSION_TRUSTED_PROXIES: str = ""
+
+    # Per farmer snapshot cache memory budget in bytes, 0 disables it
+    SNAPSHOT_CACHE_MAX_BYTES: int = 0
+
+    # On demand request profiling, see profiling.py
+    PROFILING_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0
+    PROFILE_INTERVAL_MS: float = 5
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_FILES: int = 200
+
+    # Streaming NDJSON ingestion: rows validated and committed per chunk, longest accepted line
+    INGEST_CHUNK_SIZE: int = 1000
+    INGEST_MAX_LINE_BYTES: int = 65536
+
+    # Batched backfills in migrations, see migration_helpers.py
+    MIGRATION_BATCH_SIZE: int = 5000
+    MIGRATION_BATCH_PAUSE_MS: int = 50
+
+    # Background report jobs, see jobs.py
+    REPORT_JOBS_ENABLED: bool = True
+    REPORT_WORKERS: int = 2
+    REPORT_MAX_QUEUED: int = 100
+    REPORT_POLL_SECONDS: float = 1
+    REPORT_JOB_TIMEOUT_SECONDS: int = 1800
+    REPORT_DIR: str = "reports"
+
+    # Season forecasts, see forecasting.py: seconds before a crop's cached history is reloaded
+    FORECAST_CACHE_TTL_SECONDS: int = 300
+    # most crop histories kept, least recently used are dropped first
+    FORECAST_CACHE_MAX_CROPS: int = 200
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from utils import settings
+
+
+T = TypeVar("T")
+
+# sentinel put on the queue to stop the writer thread
+_STOP = object()
+
+
+def _writer_engine(engine: Engine) -> Engine:
+    """Engine for the writer thread.
+
+    pysqlite does not open a transaction before SAVEPOINT, so the first savepoint of a batch
+    would start one and its RELEASE would commit it, one commit per operation. The writer
+    gets its own engine on which pysqlite's transaction handling is turned off and BEGIN is
+    emitted by SQLAlchemy, so savepoints nest inside one transaction per batch.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    writer_engine = create_engine(engine.url, connect_args={"check_same_thread": False}, echo=engine.echo)
+
+    @event.listens_for(writer_engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine, "begin")
+    def do_begin(connection):
+        # the writer only writes, take the write lock up front rather than on the first write
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
+
+
+class WriteQueue:
+    """Single writer that gathers write operations into one transaction and one commit.
+
+    Each operation is a callable taking a Session. Operations submitted within the
+    batching window run one after another inside their own savepoint, so a failing
+    operation only rolls back its own changes. The whole batch is then committed once
+    and every caller's future is resolved with its own result or error.
+    """
+
+    def __init__(self, engine: Engine, window_ms: int = 5, max_batch: int = 200):
+        self.shared_engine = engine
+        self.engine = _writer_engine(engine)
+        self.session_factory = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, expire_on_commit=False)
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._ops: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, op: Callable[[Session], T]) -> "Future[T]":
+        """Queue a write operation and return a future for its result."""
+        self._ensure_started()
+        future: Future = Future()
+        self._ops.put((op, future))
+        return future
+
+    def stop(self):
+        """Commit whatever is queued and stop the writer thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._ops.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self.engine is not self.shared_engine:
+            self.engine.dispose()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._ops.get()
+            if item is _STOP:
+                return
+
+            # gather more operations until the window closes or the batch is full
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._ops.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list):
+        db = self.session_factory()
+        done = []
+        try:
+            for op, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # run each op in a savepoint so its failure does not affect the others
+                try:
+                    with db.begin_nested():
+                        result = op(db)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    done.append((future, result))
+            db.commit()
+        except Exception as e:
+            # the commit itself failed, so none of the remaining ops were saved
+            db.rollback()
+            for future, _ in done:
+                future.set_exception(e)
+        else:
+            for future, result in done:
+                future.set_result(result)
+        finally:
+            db.close()
+
+
+# one writer per database engine
+_queues: dict[Engine, WriteQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(engine: Engine) -> WriteQueue:
+    """Return the write queue for the given engine, creating it on first use."""
+    with _queues_lock:
+        if engine not in _queues:
+            _queues[engine] = WriteQueue(
+                engine,
+                window_ms=settings.WRITE_QUEUE_WINDOW_MS,
+                max_batch=settings.WRITE_QUEUE_MAX_BATCH,
+            )
+        return _queues[engine]
+
+
+def run_write(db: Session, op: Callable[[Session], T]) -> T:
+    """Run a write operation and commit it.
+
+    When the write queue is enabled the operation is handed to the single writer for
+    the request's database and this call blocks until its batch is committed.
+    Otherwise it runs directly on the request session. Errors raised by the operation
+    (e.g. HTTPException) are re-raised to the caller either way.
+    """
+    if not settings.WRITE_QUEUE_ENABLED:
+        result = op(db)
+        db.commit()
+        return result
+
+    # end the request's read transaction so its connection goes back to the pool
+    # while waiting, otherwise waiting handlers can starve the writer of connections
+    db.rollback()
+    return get_write_queue(db.get_bind()).submit(op).result()
+
+
+def stop_write_queues():
+    """Flush and stop every running write queue. Called on app shutdown."""
+    with _queues_lock:
+        queues = list(_queues.values())
+    for write_queue in queues:
+        write_queue.stop()